@@ -11,10 +11,14 @@ import asyncio
 import json
 import platform
 import random
+import sqlite3
 import subprocess
 import threading
-import tkinter as tk
-from tkinter import messagebox, simpledialog, ttk
+import weakref
+import concurrent.futures
+import functools
+import queue
+from collections import OrderedDict
 from typing import List, Dict, Any, Optional, Literal
 import sys
 import os
@@ -22,9 +26,10 @@ import time
 import atexit
 import re
 import logging
-import urllib.request
-import urllib.error
+import http.client
 import base64
+import tempfile
+import importlib.util
 import io
 from pydantic import Field
 from typing import Annotated
@@ -55,16 +60,23 @@ from mcp.types import ImageContent, TextContent
 np = None
 PILImage = None
 RapidOCR = None
+_OCR_ENGINE = None
 
 try:
-    import numpy as np
     from PIL import Image as PILImage
-    from rapidocr_onnxruntime import RapidOCR
-    _OCR_ENGINE = RapidOCR()
-    _OCR_IMPORTED = True
 except Exception:
-    _OCR_ENGINE = None
+    PILImage = None
+
+# numpy + rapidocr (onnxruntime) are slow to import and the engine loads its
+# models on construction, so only check they are installed here; the engine is
+# built by _get_ocr_engine() on the first OCR request.
+try:
+    _OCR_IMPORTED = PILImage is not None and all(
+        importlib.util.find_spec(name) is not None for name in ("numpy", "rapidocr_onnxruntime")
+    )
+except Exception:
     _OCR_IMPORTED = False
+_ocr_engine_lock = threading.Lock()
 
 try:
     import pygetwindow as gw
@@ -76,6 +88,30 @@ try:
 except Exception:
     pyautogui = None
 
+# orjson — optional faster JSON for Telegram traffic and the state files
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+if orjson is not None:
+    _json_dumps_bytes = orjson.dumps
+    _json_loads_bytes = orjson.loads
+else:
+    _compact_json_encode = json.JSONEncoder(separators=(",", ":"), ensure_ascii=False).encode
+
+    def _json_dumps_bytes(data: Any) -> bytes:
+        return _compact_json_encode(data).encode("utf-8")
+
+    # json.loads takes UTF-8 bytes as well as str
+    _json_loads_bytes = json.loads
+
+# uvloop — optional faster asyncio event loop (not available on Windows)
+try:
+    import uvloop
+except ImportError:
+    uvloop = None
+
 # Whispr — optional voice-message transcription
 try:
     from whispr import (
@@ -83,7 +119,6 @@ try:
         is_enabled as whispr_is_enabled,
         get_config as whispr_get_config,
         get_transcriber as whispr_get_transcriber,
-        download_telegram_voice as whispr_download_voice,
         install_dependencies as whispr_install_deps,
         ensure_ready as whispr_ensure_ready,
     )
@@ -103,19 +138,53 @@ IS_WINDOWS = CURRENT_PLATFORM == 'windows'
 IS_MACOS = CURRENT_PLATFORM == 'darwin'
 IS_LINUX = CURRENT_PLATFORM == 'linux'
 
+if IS_WINDOWS:
+    import ctypes
+    import ctypes.wintypes
+    import msvcrt
+    try:
+        _kernel32 = ctypes.windll.kernel32
+    except Exception:
+        _kernel32 = None
+else:
+    import fcntl
+
 # Initialize the MCP server
 mcp = FastMCP("Human-in-the-Loop Server")
 
+# tkinter is imported on first use (see _load_tkinter) so Telegram-only setups
+# never pay for loading Tcl/Tk.
+tk = None
+
 # Global variable to ensure GUI is initialized properly
 _gui_initialized = False
 _gui_lock = threading.Lock()
 
+# Tk objects may only be used from the thread that created them, so every dialog
+# runs on this single worker, which owns one hidden root for the whole process.
+# Tools await the worker's futures, so an open dialog never blocks the event loop.
+_gui_executor = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix="hitl-gui")
+_gui_root = None
+_gui_screen_size = None  # (width, height), read from Tk once per root
+
 _telegram_lock = threading.Lock()
 _telegram_last_update_id: Optional[int] = None
 
 # Delineator used to separate AI output from user input in multiline dialog
 MULTILINE_DELINEATOR = "─" * 50
 
+# Keys the multiline dialog's printable-key guard lets through untouched
+_NON_PRINTABLE_KEYSYMS = frozenset({
+    'BackSpace', 'Delete',
+    'Up', 'Down', 'Left', 'Right',
+    'Home', 'End', 'Prior', 'Next',
+    'Shift_L', 'Shift_R', 'Control_L', 'Control_R',
+    'Alt_L', 'Alt_R', 'Tab', 'ISO_Left_Tab',
+    'Escape', 'Return',
+    'F1', 'F2', 'F3', 'F4', 'F5', 'F6', 'F7', 'F8', 'F9', 'F10', 'F11', 'F12',
+})
+_MOD_MASK_CTRL_ALT = 0x4 | 0x8  # Tk event.state bits for Control and Alt
+
 # ── Session Coordination for Multi-Instance Telegram HITL ──────────────────
 
 class SessionCoordinator:
@@ -133,10 +202,18 @@ class SessionCoordinator:
     BASE_DIR = os.path.join(os.path.expanduser("~"), ".hitl-mcp")
     SESSIONS_FILE = os.path.join(BASE_DIR, "sessions.json")
     OFFSET_FILE = os.path.join(BASE_DIR, "telegram_offset.json")
-    RESPONSES_DIR = os.path.join(BASE_DIR, "responses")
     POLL_LOCK_FILE = os.path.join(BASE_DIR, "poll.lock")
-    MESSAGE_MAP_FILE = os.path.join(BASE_DIR, "message_map.json")
-    ACTIVE_CONTEXT_FILE = os.path.join(BASE_DIR, "active_context.json")
+    # Message map and pending responses: shared SQLite DB in WAL mode
+    STATE_DB_FILE = os.path.join(BASE_DIR, "state.db")
+    MESSAGE_MAP_LIMIT = 200
+    # record_message() trims the map once per this many inserts
+    MESSAGE_MAP_TRIM_EVERY = 20
+    # get_active_sessions() result is reused this long (seconds)
+    SESSIONS_CACHE_TTL = 2.0
+    # _is_pid_alive() verdicts are reused this long (seconds)
+    PID_ALIVE_TTL = 5.0
+    # Active context older than this (seconds) no longer routes messages
+    ACTIVE_CONTEXT_TTL = 300
 
     SESSION_ICONS = ["🦄", "🐙", "🦀", "🐥", "🦋", "🐈", "🐨", "🦥", "🐛", "🐝", "🦩"]
 
@@ -145,14 +222,29 @@ class SessionCoordinator:
         self.session_number: Optional[int] = None
         self.workspace_name: Optional[str] = None
         self.pid = os.getpid()
-        self._lock_fd = None
+        self._lock_fd: Optional[int] = None  # poll.lock fd, kept open once created
+        self._poll_guard = threading.Lock()
         self._is_poller = False
         self._registered = False
+        self._db_conn: Optional[sqlite3.Connection] = None
+        self._db_lock = threading.Lock()
+        self._sessions_cache: tuple = (0.0, [])  # (monotonic time, sessions)
+        self._db_seen_version: Optional[int] = None
+        self._inserts_since_trim = 0
+        self._session_icon: Optional[str] = None
+        self._tag: Optional[str] = None
+        self._sessions_index: tuple = (None, {}, {})  # (sessions list, by session_id, by number)
+        self._keyboard_cache: tuple = (None, [], None)  # (sessions list it was built from, keyboard, markup JSON)
+        self._pid_alive_cache: Dict[int, tuple] = {}  # pid -> (monotonic time, alive)
         os.makedirs(self.BASE_DIR, exist_ok=True)
-        os.makedirs(self.RESPONSES_DIR, exist_ok=True)
 
     # ── Helpers ──
 
+    # Directory names that say nothing about the workspace (compared lowercased)
+    _VSCODE_SKIP = frozenset({"vs code", "code", "microsoft vs code"})
+    _SCRIPT_DIR_SKIP = frozenset({"scripts", "bin", "__pycache__", "site-packages", ".tmp",
+                                  "hitl-mcp-server", "mcp"})
+
     def _get_workspace_name(self) -> str:
         """Detect a human-readable workspace name for this session.
 
@@ -169,26 +261,24 @@ class SessionCoordinator:
             return name
 
         # 2. VS Code env vars (prefer WORKSPACE_FOLDER, then CWD)
-        _vscode_skip = {"vs code", "code", "microsoft vs code"}
         for var in ("VSCODE_WORKSPACE_FOLDER", "WORKSPACE_FOLDER", "VSCODE_CWD"):
             val = os.getenv(var, "").strip()
             if val and os.path.isdir(val):
                 basename = os.path.basename(val)
-                if basename.lower() not in _vscode_skip and "vs code" not in val.lower():
+                if basename.lower() not in self._VSCODE_SKIP and "vs code" not in val.lower():
                     return basename
 
         # 3. Script's parent directory (skip generic dirs + the MCP folder itself)
         if sys.argv:
             script_dir = os.path.dirname(os.path.abspath(sys.argv[0]))
             dirname = os.path.basename(script_dir)
-            skip = {"scripts", "bin", "__pycache__", "site-packages", ".tmp",
-                    "hitl-mcp-server", "mcp"}
-            if dirname and dirname.lower() not in skip:
+            if dirname and dirname.lower() not in self._SCRIPT_DIR_SKIP:
                 return dirname
 
         # 4. CWD (skip common VS Code install dirs)
         cwd_name = os.path.basename(os.getcwd())
-        if cwd_name and "vs code" not in cwd_name.lower() and cwd_name.lower() not in _vscode_skip:
+        cwd_lower = cwd_name.lower()
+        if cwd_name and "vs code" not in cwd_lower and cwd_lower not in self._VSCODE_SKIP:
             return cwd_name
 
         return f"Session-{os.getpid()}"
@@ -196,21 +286,51 @@ class SessionCoordinator:
     def _json_read(self, filepath: str) -> Any:
         try:
             if os.path.exists(filepath):
-                with open(filepath, "r", encoding="utf-8") as f:
-                    return json.load(f)
-        except (json.JSONDecodeError, IOError, OSError):
+                with open(filepath, "rb") as f:
+                    return _json_loads_bytes(f.read())
+        except (json.JSONDecodeError, UnicodeDecodeError, IOError, OSError):
             pass
         return None
 
     def _json_write(self, filepath: str, data: Any):
-        tmp = filepath + ".tmp"
+        """Atomically replace *filepath* with compact JSON; no-op if unchanged."""
+        payload = _json_dumps_bytes(data)
         try:
-            with open(tmp, "w", encoding="utf-8") as f:
-                json.dump(data, f, indent=2)
-            os.replace(tmp, filepath)
+            with open(filepath, "rb") as f:
+                if f.read() == payload:
+                    return
         except OSError:
-            with open(filepath, "w", encoding="utf-8") as f:
-                json.dump(data, f, indent=2)
+            pass
+        tmp = filepath + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(payload)
+        os.replace(tmp, filepath)
+
+    def _db(self) -> sqlite3.Connection:
+        """Open (once) the shared state DB; callers hold ``self._db_lock``.
+
+        WAL lets every instance read while one writes, and each statement is a
+        point lookup or insert instead of rewriting a whole JSON file.
+        """
+        if self._db_conn is None:
+            conn = sqlite3.connect(self.STATE_DB_FILE, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS message_map ("
+                "message_id INTEGER PRIMARY KEY, session_id TEXT NOT NULL)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "session_id TEXT PRIMARY KEY, text TEXT NOT NULL, ts REAL NOT NULL)"
+            )
+            # Single-row table: the session picked by the last button tap
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS active_context ("
+                "id INTEGER PRIMARY KEY CHECK (id = 0), session_id TEXT NOT NULL, ts REAL NOT NULL)"
+            )
+            self._db_conn = conn
+        return self._db_conn
 
     _PYTHON_EXE_NAMES = frozenset({"python.exe", "python3.exe", "pythonw.exe", "python"})
 
@@ -224,21 +344,27 @@ class SessionCoordinator:
         if pid <= 0:
             return False
 
+        now = time.monotonic()
+        cached = self._pid_alive_cache.get(pid)
+        if cached is not None and now - cached[0] < self.PID_ALIVE_TTL:
+            return cached[1]
+
         if IS_WINDOWS:
-            return self._is_pid_alive_windows(pid)
+            alive = self._is_pid_alive_windows(pid)
         else:
-            return self._is_pid_alive_unix(pid)
+            alive = self._is_pid_alive_unix(pid)
+        self._pid_alive_cache[pid] = (now, alive)
+        return alive
 
     # ── Windows PID validation ──
 
     def _is_pid_alive_windows(self, pid: int) -> bool:
         """Windows: open the process and verify its image name is python*."""
+        if _kernel32 is None:
+            return self._is_pid_alive_windows_fallback(pid)
         try:
-            import ctypes
-            import ctypes.wintypes
-
             PROCESS_QUERY_LIMITED_INFORMATION = 0x1000
-            handle = ctypes.windll.kernel32.OpenProcess(
+            handle = _kernel32.OpenProcess(
                 PROCESS_QUERY_LIMITED_INFORMATION, False, pid,
             )
             if not handle:
@@ -248,7 +374,7 @@ class SessionCoordinator:
                 # QueryFullProcessImageNameW → full exe path
                 buf = ctypes.create_unicode_buffer(1024)
                 buf_size = ctypes.wintypes.DWORD(1024)
-                ok = ctypes.windll.kernel32.QueryFullProcessImageNameW(
+                ok = _kernel32.QueryFullProcessImageNameW(
                     handle, 0, buf, ctypes.byref(buf_size),
                 )
                 if ok and buf.value:
@@ -257,7 +383,7 @@ class SessionCoordinator:
                 # QueryFullProcessImageNameW failed (rare) — fall back
                 return self._is_pid_alive_windows_fallback(pid)
             finally:
-                ctypes.windll.kernel32.CloseHandle(handle)
+                _kernel32.CloseHandle(handle)
         except Exception:
             # ctypes itself failed — fall back to tasklist
             return self._is_pid_alive_windows_fallback(pid)
@@ -327,7 +453,7 @@ class SessionCoordinator:
         alive = {}
         for sid, info in sessions.items():
             pid = info.get("pid", 0)
-            if self._is_pid_alive(pid):
+            if pid == self.pid or self._is_pid_alive(pid):
                 alive[sid] = info
             else:
                 # PID is dead or not Python — drop it
@@ -337,7 +463,8 @@ class SessionCoordinator:
 
     def register(self) -> int:
         """Register this MCP instance. Returns session number (1-9)."""
-        self.workspace_name = self._get_workspace_name()
+        if self.workspace_name is None:
+            self.workspace_name = self._get_workspace_name()
         data = self._read_sessions()
         data = self._cleanup_stale(data)
 
@@ -366,7 +493,11 @@ class SessionCoordinator:
             "last_seen": time.time(),
         }
         self._write_sessions(data)
+        if not self._registered:
+            atexit.register(self.deregister)
         self._registered = True
+        self._sessions_cache = (0.0, [])
+        self._tag = f"{self._session_icon} #{self.session_number} · {self.workspace_name}"
         return self.session_number
 
     def touch_session(self):
@@ -391,19 +522,28 @@ class SessionCoordinator:
             self._write_sessions(data)
         except Exception:
             pass
+        self._sessions_cache = (0.0, [])
         try:
-            resp = os.path.join(self.RESPONSES_DIR, f"{self.session_id}.json")
-            if os.path.exists(resp):
-                os.remove(resp)
+            with self._db_lock:
+                self._db().execute("DELETE FROM responses WHERE session_id = ?", (self.session_id,))
         except Exception:
             pass
         self.release_poll_lock()
         self._registered = False
 
     def get_active_sessions(self) -> List[Dict]:
+        """Live sessions sorted by number; cached for SESSIONS_CACHE_TTL seconds.
+
+        The file is only rewritten when stale sessions were actually pruned.
+        """
+        cached_at, cached = self._sessions_cache
+        if time.monotonic() - cached_at < self.SESSIONS_CACHE_TTL:
+            return cached
         data = self._read_sessions()
+        known = len(data["sessions"])
         data = self._cleanup_stale(data)
-        self._write_sessions(data)
+        if len(data["sessions"]) != known:
+            self._write_sessions(data)
         result = []
         for sid, info in data["sessions"].items():
             n = info["number"]
@@ -415,24 +555,44 @@ class SessionCoordinator:
                 "pid": info["pid"],
                 "icon": icon,
             })
-        return sorted(result, key=lambda s: s["number"])
+        result.sort(key=lambda s: s["number"])
+        self._sessions_cache = (time.monotonic(), result)
+        return result
+
+    def _session_lookup(self) -> tuple:
+        """(by session_id, by number) dicts over the current get_active_sessions() list."""
+        sessions = self.get_active_sessions()
+        built_from, by_id, by_number = self._sessions_index
+        if sessions is not built_from:
+            by_id = {s["session_id"]: s for s in sessions}
+            by_number = {s["number"]: s for s in sessions}
+            self._sessions_index = (sessions, by_id, by_number)
+        return by_id, by_number
+
+    def get_session(self, session_id: str) -> Optional[Dict]:
+        return self._session_lookup()[0].get(session_id)
 
     def session_id_by_number(self, number: int) -> Optional[str]:
-        for s in self.get_active_sessions():
-            if s["number"] == number:
-                return s["session_id"]
-        return None
+        s = self._session_lookup()[1].get(number)
+        return s["session_id"] if s else None
 
     # ── Formatting ──
 
     def format_tag(self) -> str:
-        n = self.session_number or 0
-        icon = getattr(self, '_session_icon', None) or (self.SESSION_ICONS[n - 1] if 0 < n <= len(self.SESSION_ICONS) else "🔷")
-        return f"{icon} #{n} · {self.workspace_name}"
+        # Number, icon and workspace are fixed once registered (see register())
+        if self._tag is None:
+            n = self.session_number or 0
+            icon = self._session_icon or (self.SESSION_ICONS[n - 1] if 0 < n <= len(self.SESSION_ICONS) else "🔷")
+            self._tag = f"{icon} #{n} · {self.workspace_name}"
+        return self._tag
 
     def build_inline_keyboard(self) -> List[List[Dict]]:
         sessions = self.get_active_sessions()
+        built_from, keyboard, _markup = self._keyboard_cache
+        if sessions is built_from:
+            return keyboard
         if len(sessions) <= 1:
+            self._keyboard_cache = (sessions, [], None)
             return []
         buttons: List[List[Dict]] = []
         row: List[Dict] = []
@@ -446,8 +606,17 @@ class SessionCoordinator:
                 row = []
         if row:
             buttons.append(row)
+        self._keyboard_cache = (sessions, buttons, _json_dumps_bytes({"inline_keyboard": buttons}).decode("utf-8"))
         return buttons
 
+    def inline_keyboard_markup(self) -> Optional[str]:
+        """``reply_markup`` JSON for the session keyboard; None with a single session.
+
+        Serialized once per keyboard rather than on every prompt.
+        """
+        self.build_inline_keyboard()
+        return self._keyboard_cache[2]
+
     # ── Shared Telegram offset ──
 
     def get_shared_offset(self) -> int:
@@ -455,51 +624,102 @@ class SessionCoordinator:
         return data.get("offset", 0) if isinstance(data, dict) else 0
 
     def set_shared_offset(self, offset: int):
+        """Persist ``offset``, never moving the stored one backwards.
+
+        The poller loop and the nested Whispr wait both commit here, so a
+        late write of an older batch must not undo what the other consumed.
+        """
+        data = self._json_read(self.OFFSET_FILE)
+        current = data.get("offset") if isinstance(data, dict) else None
+        if isinstance(current, int) and current >= offset:
+            return
         self._json_write(self.OFFSET_FILE, {"offset": offset})
 
     def init_shared_offset_if_needed(self):
-        """Drain old Telegram updates so they don't interfere."""
-        if self.get_shared_offset() > 0:
+        """Drain old Telegram updates so they don't interfere.
+
+        Runs once per state directory: any persisted offset (even 0, after a
+        bootstrap that found no pending updates) means it already happened, so
+        restarts resume from the file instead of asking Telegram again. A failed
+        bootstrap persists nothing and is retried on the next prompt.
+        """
+        data = self._json_read(self.OFFSET_FILE)
+        if isinstance(data, dict) and "offset" in data:
             return
         try:
-            updates = _telegram_api_call("getUpdates", {"timeout": 0, "limit": 100}, timeout=10)
-            result = updates.get("result", [])
-            if result:
-                self.set_shared_offset(max(item.get("update_id", 0) for item in result))
-            else:
-                self.set_shared_offset(0)
+            updates = _telegram_api_call("getUpdates", _telegram_bootstrap_query(), timeout=10)
         except Exception:
-            self.set_shared_offset(0)
+            return
+        result = updates.get("result", [])
+        self.set_shared_offset(max((item.get("update_id", 0) for item in result), default=0))
 
     # ── Message map (message_id → session_id) ──
 
     def record_message(self, message_id: int):
-        data = self._json_read(self.MESSAGE_MAP_FILE) or {}
-        data[str(message_id)] = self.session_id
-        if len(data) > 200:
-            items = sorted(data.items(), key=lambda x: int(x[0]))
-            data = dict(items[-200:])
-        self._json_write(self.MESSAGE_MAP_FILE, data)
+        with self._db_lock:
+            db = self._db()
+            db.execute(
+                "INSERT OR REPLACE INTO message_map (message_id, session_id) VALUES (?, ?)",
+                (message_id, self.session_id),
+            )
+            self._inserts_since_trim += 1
+            if self._inserts_since_trim < self.MESSAGE_MAP_TRIM_EVERY:
+                return
+            self._inserts_since_trim = 0
+            # Keep only the newest MESSAGE_MAP_LIMIT ids (primary-key ordered)
+            db.execute(
+                "DELETE FROM message_map WHERE message_id <= "
+                "(SELECT message_id FROM message_map ORDER BY message_id DESC LIMIT 1 OFFSET ?)",
+                (self.MESSAGE_MAP_LIMIT,),
+            )
 
     def lookup_message(self, message_id: int) -> Optional[str]:
-        data = self._json_read(self.MESSAGE_MAP_FILE) or {}
-        return data.get(str(message_id))
+        with self._db_lock:
+            row = self._db().execute(
+                "SELECT session_id FROM message_map WHERE message_id = ?", (message_id,)
+            ).fetchone()
+        return row[0] if row else None
 
-    # ── Response file I/O ──
+    # ── Pending responses (poller → target session) ──
 
     def write_response(self, target_session_id: str, text: str):
-        path = os.path.join(self.RESPONSES_DIR, f"{target_session_id}.json")
-        self._json_write(path, {"text": text, "ts": time.time()})
+        with self._db_lock:
+            self._db().execute(
+                "INSERT OR REPLACE INTO responses (session_id, text, ts) VALUES (?, ?, ?)",
+                (target_session_id, text, time.time()),
+            )
 
     def read_response(self) -> Optional[str]:
         if not self.session_id:
             return None
-        path = os.path.join(self.RESPONSES_DIR, f"{self.session_id}.json")
         try:
-            if os.path.exists(path):
-                data = self._json_read(path)
-                os.remove(path)
-                return data.get("text") if isinstance(data, dict) else None
+            with self._db_lock:
+                db = self._db()
+                # data_version only changes when another connection commits, so
+                # an idle wait costs one pragma instead of a write transaction.
+                version = db.execute("PRAGMA data_version").fetchone()[0]
+                if version == self._db_seen_version:
+                    return None
+                row = None
+                if db.execute(
+                    "SELECT 1 FROM responses WHERE session_id = ?", (self.session_id,)
+                ).fetchone() is not None:
+                    # Take the response in one write transaction so it is read once
+                    db.execute("BEGIN IMMEDIATE")
+                    try:
+                        row = db.execute(
+                            "SELECT text FROM responses WHERE session_id = ?", (self.session_id,)
+                        ).fetchone()
+                        if row:
+                            db.execute("DELETE FROM responses WHERE session_id = ?", (self.session_id,))
+                        db.execute("COMMIT")
+                    except Exception:
+                        db.execute("ROLLBACK")
+                        raise
+                # Only mark this version seen once it was fully handled; after a
+                # failure (e.g. "database is locked") the next tick retries.
+                self._db_seen_version = version
+            return row[0] if row else None
         except Exception:
             pass
         return None
@@ -507,61 +727,83 @@ class SessionCoordinator:
     # ── Polling lock (only one instance polls Telegram) ──
 
     def try_acquire_poll_lock(self) -> bool:
-        try:
-            self._lock_fd = open(self.POLL_LOCK_FILE, "w")
-            if IS_WINDOWS:
-                import msvcrt
-                msvcrt.locking(self._lock_fd.fileno(), msvcrt.LK_NBLCK, 1)
-            else:
-                import fcntl
-                fcntl.flock(self._lock_fd.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        """Become the poller if no other instance (or thread of this one) is.
+
+        The lock file descriptor is opened once and kept for the life of the
+        process; releasing only unlocks it. It is close-on-exec, so a child
+        process (e.g. ffmpeg under Whispr) can never hold the lock.
+
+        On POSIX this is an fcntl record lock (lockf), which network file
+        systems honour unlike flock. Record locks belong to the process, not
+        the descriptor, so in-process exclusion comes from ``_is_poller`` and
+        the file must not be opened (and closed) anywhere else in the process.
+        """
+        with self._poll_guard:
+            if self._is_poller:
+                # Another prompt in this process already polls and routes to us
+                return False
+            try:
+                if self._lock_fd is None:
+                    self._lock_fd = os.open(
+                        self.POLL_LOCK_FILE,
+                        os.O_WRONLY | os.O_CREAT | getattr(os, "O_CLOEXEC", 0),
+                        0o644,
+                    )
+                if IS_WINDOWS:
+                    os.lseek(self._lock_fd, 0, os.SEEK_SET)
+                    msvcrt.locking(self._lock_fd, msvcrt.LK_NBLCK, 1)
+                else:
+                    fcntl.lockf(self._lock_fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                return False
             self._is_poller = True
             return True
-        except Exception:
-            if self._lock_fd:
-                try:
-                    self._lock_fd.close()
-                except Exception:
-                    pass
-                self._lock_fd = None
-            self._is_poller = False
-            return False
 
     def release_poll_lock(self):
-        if self._lock_fd:
+        with self._poll_guard:
+            if not self._is_poller:
+                return
             try:
                 if IS_WINDOWS:
-                    import msvcrt
-                    msvcrt.locking(self._lock_fd.fileno(), msvcrt.LK_UNLCK, 1)
+                    os.lseek(self._lock_fd, 0, os.SEEK_SET)
+                    msvcrt.locking(self._lock_fd, msvcrt.LK_UNLCK, 1)
                 else:
-                    import fcntl
-                    fcntl.flock(self._lock_fd.fileno(), fcntl.LOCK_UN)
-                self._lock_fd.close()
-            except Exception:
+                    fcntl.lockf(self._lock_fd, fcntl.LOCK_UN)
+            except OSError:
                 pass
-            self._lock_fd = None
-        self._is_poller = False
+            self._is_poller = False
 
     # ── Active context (tracks last button-tap session) ──
 
     def set_active_context(self, session_id: str):
-        self._json_write(self.ACTIVE_CONTEXT_FILE, {"session_id": session_id, "ts": time.time()})
+        with self._db_lock:
+            self._db().execute(
+                "INSERT OR REPLACE INTO active_context (id, session_id, ts) VALUES (0, ?, ?)",
+                (session_id, time.time()),
+            )
 
     def clear_active_context(self):
-        """Remove the active-context file without returning its value."""
+        """Drop the active context without returning its value."""
         try:
-            if os.path.exists(self.ACTIVE_CONTEXT_FILE):
-                os.remove(self.ACTIVE_CONTEXT_FILE)
+            with self._db_lock:
+                self._db().execute("DELETE FROM active_context")
         except Exception:
             pass
 
     def get_and_clear_active_context(self) -> Optional[str]:
         try:
-            if os.path.exists(self.ACTIVE_CONTEXT_FILE):
-                data = self._json_read(self.ACTIVE_CONTEXT_FILE)
-                os.remove(self.ACTIVE_CONTEXT_FILE)
-                if isinstance(data, dict) and time.time() - data.get("ts", 0) < 300:
-                    return data.get("session_id")
+            with self._db_lock:
+                db = self._db()
+                if db.execute("SELECT 1 FROM active_context").fetchone() is None:
+                    return None
+                db.execute("BEGIN IMMEDIATE")
+                try:
+                    row = db.execute("SELECT session_id, ts FROM active_context").fetchone()
+                    db.execute("DELETE FROM active_context")
+                finally:
+                    db.execute("COMMIT")
+            if row and time.time() - row[1] < self.ACTIVE_CONTEXT_TTL:
+                return row[0]
         except Exception:
             pass
         return None
@@ -570,30 +812,142 @@ class SessionCoordinator:
 # Global session coordinator — initialised in main()
 _session_coordinator: Optional[SessionCoordinator] = None
 
+# Telegram credentials come from the MCP server's environment, which is fixed for
+# the life of the process — read them once instead of on every API call.
+_TG_TOKEN = os.getenv("HITL_TELEGRAM_BOT_TOKEN", "").strip()
+_TG_CHAT_ID = os.getenv("HITL_TELEGRAM_CHAT_ID", "").strip()
+# Numeric chat IDs (the common case) are compared as ints; "@channel" names as strings
+# (fullmatch, not isdigit: "--5" or "²" would pass isdigit and crash int())
+_TG_CHAT_ID_INT = int(_TG_CHAT_ID) if re.fullmatch(r"-?\d+", _TG_CHAT_ID) else None
+
+# Fixed for the process lifetime; tool handlers test this directly
+_TELEGRAM_ENABLED = bool(_TG_TOKEN and _TG_CHAT_ID)
+
 def is_telegram_enabled() -> bool:
     """Check whether Telegram transport is configured via environment variables."""
-    return bool(os.getenv("HITL_TELEGRAM_BOT_TOKEN") and os.getenv("HITL_TELEGRAM_CHAT_ID"))
+    return _TELEGRAM_ENABLED
 
 def _telegram_chat_id_matches(incoming_chat_id: Any) -> bool:
-    configured_chat_id = os.getenv("HITL_TELEGRAM_CHAT_ID", "").strip()
-    return str(incoming_chat_id) == configured_chat_id
+    if _TG_CHAT_ID_INT is not None and type(incoming_chat_id) is int:
+        return incoming_chat_id == _TG_CHAT_ID_INT
+    return str(incoming_chat_id) == _TG_CHAT_ID
+
+TELEGRAM_API_HOST = "api.telegram.org"
+
+# Update types the reply loop consumes
+TELEGRAM_ALLOWED_UPDATES = ["message", "edited_message", "callback_query"]
+# offset=-1 returns only the newest pending update (and forgets older ones), which
+# is all the offset bootstrap needs to skip stale messages.
+TELEGRAM_LATEST_UPDATE_QUERY = {
+    "offset": -1,
+    "limit": 1,
+    "timeout": 0,
+    "allowed_updates": TELEGRAM_ALLOWED_UPDATES,
+}
+# Without an offset getUpdates only peeks: nothing pending is confirmed
+TELEGRAM_PENDING_UPDATES_QUERY = {
+    "limit": 100,
+    "timeout": 0,
+    "allowed_updates": TELEGRAM_ALLOWED_UPDATES,
+}
+
+def _telegram_bootstrap_query() -> Dict[str, Any]:
+    """getUpdates parameters for the first-run offset bootstrap.
+
+    offset=-1 discards every older pending update on Telegram's side, so it is
+    only used while no other session is registered; otherwise those updates
+    may be replies another instance still has to pick up, and they are only
+    peeked at.
+    """
+    coord = _session_coordinator
+    if coord and any(s["session_id"] != coord.session_id for s in coord.get_active_sessions()):
+        return TELEGRAM_PENDING_UPDATES_QUERY
+    return TELEGRAM_LATEST_UPDATE_QUERY
+
+# Keep-alive connections to the Bot API, one per thread. http.client connections
+# are not thread-safe, and the poll loop, tool handlers and helper threads all
+# talk to Telegram, so each thread reuses its own socket instead of paying a TCP
+# and TLS handshake on every getUpdates/sendMessage.
+_telegram_http = threading.local()
+# Every live pooled connection, across threads, so they can be closed at exit
+_telegram_open_connections = weakref.WeakSet()
+
+# Small pool for Bot API calls that can overlap with the calling thread's work
+_telegram_io_pool = concurrent.futures.ThreadPoolExecutor(max_workers=2, thread_name_prefix="hitl-telegram")
+
+def _telegram_connection(timeout: float) -> http.client.HTTPSConnection:
+    conn = getattr(_telegram_http, "conn", None)
+    if conn is None:
+        conn = http.client.HTTPSConnection(TELEGRAM_API_HOST, timeout=timeout)
+        _telegram_http.conn = conn
+        _telegram_open_connections.add(conn)
+    conn.timeout = timeout
+    if conn.sock is not None:
+        conn.sock.settimeout(timeout)
+    return conn
+
+def _telegram_drop_connection() -> None:
+    conn = getattr(_telegram_http, "conn", None)
+    _telegram_http.conn = None
+    if conn is not None:
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+def _telegram_close_connections() -> None:
+    """Close every pooled Bot API connection and stop the I/O pool (atexit)."""
+    _telegram_io_pool.shutdown(wait=False, cancel_futures=True)
+    for conn in list(_telegram_open_connections):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+atexit.register(_telegram_close_connections)
+
+def _telegram_request(method: str, path: str, body: Optional[bytes], headers: Dict[str, str], timeout: float) -> tuple:
+    """Perform one request on this thread's pooled Bot API connection.
+
+    Returns ``(status, headers, body_bytes)``. A keep-alive socket the server
+    already closed is reopened once; any other failure drops the connection so
+    the next call starts from a fresh one.
+    """
+    for attempt in range(2):
+        conn = _telegram_connection(timeout)
+        reused = conn.sock is not None
+        try:
+            conn.request(method, path, body=body, headers=headers)
+            response = conn.getresponse()
+            data = response.read()
+            if response.will_close:
+                _telegram_drop_connection()
+            return response.status, response.headers, data
+        except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+            _telegram_drop_connection()
+            if not reused or attempt:
+                raise
+        except Exception:
+            _telegram_drop_connection()
+            raise
+
+# Request path prefix and headers shared by every API call
+_TG_API_PREFIX = f"/bot{_TG_TOKEN}/"
+_TG_JSON_HEADERS = {"Content-Type": "application/json"}
 
 def _telegram_api_call(method: str, payload: Dict[str, Any], timeout: int = 35) -> Dict[str, Any]:
-    token = os.getenv("HITL_TELEGRAM_BOT_TOKEN", "").strip()
-    if not token:
+    if not _TG_TOKEN:
         raise RuntimeError("HITL_TELEGRAM_BOT_TOKEN is not set")
 
-    url = f"https://api.telegram.org/bot{token}/{method}"
-    data = json.dumps(payload).encode("utf-8")
-    req = urllib.request.Request(
-        url,
-        data=data,
-        headers={"Content-Type": "application/json"},
-        method="POST"
+    data = _json_dumps_bytes(payload)
+    _status, _headers, body = _telegram_request(
+        "POST",
+        _TG_API_PREFIX + method,
+        data,
+        _TG_JSON_HEADERS,
+        timeout,
     )
-    with urllib.request.urlopen(req, timeout=timeout) as response:
-        body = response.read().decode("utf-8")
-        parsed = json.loads(body)
+    parsed = _json_loads_bytes(body)
     if not parsed.get("ok"):
         raise RuntimeError(f"Telegram API error for {method}: {parsed}")
     return parsed
@@ -648,6 +1002,12 @@ def _split_telegram_message(text: str, max_length: int = TELEGRAM_MAX_MESSAGE_LE
     return [c for c in chunks if c.strip()]
 
 
+# Markdown → Telegram HTML patterns, compiled once
+_MD_CODE_BLOCK_RE = re.compile(r"```(\w*)\n?(.*?)```", re.DOTALL)
+_MD_INLINE_CODE_RE = re.compile(r"`([^`\n]+)`")
+_MD_BOLD_RE = re.compile(r"\*\*(.+?)\*\*", re.DOTALL)
+_MD_ITALIC_RE = re.compile(r"(?<!\*)\*([^*\n]+?)\*(?!\*)")
+
 def _markdown_to_telegram_html(text: str) -> str:
     """Convert simple markdown formatting to Telegram-safe HTML.
     
@@ -659,17 +1019,20 @@ def _markdown_to_telegram_html(text: str) -> str:
     text = text.replace("<", "&lt;")
     text = text.replace(">", "&gt;")
     
-    # Code blocks (```...```) — must be done before inline code
-    text = re.sub(r"```(\w*)\n?(.*?)```", r"<pre>\2</pre>", text, flags=re.DOTALL)
-    
-    # Inline code (`...`)
-    text = re.sub(r"`([^`\n]+)`", r"<code>\1</code>", text)
-    
-    # Bold (**...**)
-    text = re.sub(r"\*\*(.+?)\*\*", r"<b>\1</b>", text, flags=re.DOTALL)
+    # Plain text (no backticks or asterisks) needs no pattern passes at all
+    if "`" in text:
+        # Code blocks (```...```) — must be done before inline code
+        text = _MD_CODE_BLOCK_RE.sub(r"<pre>\2</pre>", text)
+        
+        # Inline code (`...`)
+        text = _MD_INLINE_CODE_RE.sub(r"<code>\1</code>", text)
     
-    # Italic (*...*)  — but not inside <b> tags or when preceded by another *
-    text = re.sub(r"(?<!\*)\*([^*\n]+?)\*(?!\*)", r"<i>\1</i>", text)
+    if "*" in text:
+        # Bold (**...**)
+        text = _MD_BOLD_RE.sub(r"<b>\1</b>", text)
+        
+        # Italic (*...*)  — but not inside <b> tags or when preceded by another *
+        text = _MD_ITALIC_RE.sub(r"<i>\1</i>", text)
     
     return text
 
@@ -720,17 +1083,109 @@ def _telegram_send_long_message(chat_id: str, text: str, reply_markup: str = Non
     return last_result
 
 
+def _telegram_load_offset() -> Optional[int]:
+    """Read the last processed update_id persisted by a previous run, if any."""
+    try:
+        with open(SessionCoordinator.OFFSET_FILE, "rb") as f:
+            offset = _json_loads_bytes(f.read()).get("offset")
+        return int(offset) if offset else None
+    except (OSError, ValueError, TypeError, AttributeError):
+        return None
+
+def _telegram_save_offset(update_id: int) -> None:
+    """Persist the last processed update_id so a restart resumes from it.
+
+    Shares the coordinator's offset file, so both code paths agree on where
+    the update stream was left off.
+    """
+    path = SessionCoordinator.OFFSET_FILE
+    tmp = path + ".tmp"
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(tmp, "wb") as f:
+            f.write(_json_dumps_bytes({"offset": update_id}))
+        os.replace(tmp, path)
+    except OSError:
+        pass
+
+def _telegram_bump_offset(update_id: int) -> None:
+    """Advance the in-process offset to ``update_id`` (never backwards) and persist it.
+
+    No lock: the offset is a single int that only the current poller advances,
+    and a lost race merely re-fetches an update that is then filtered again.
+    """
+    global _telegram_last_update_id
+    if update_id > (_telegram_last_update_id or 0):
+        _telegram_last_update_id = update_id
+        _telegram_save_offset(update_id)
+
+def _telegram_next_offset() -> int:
+    """Offset for the next getUpdates call.
+
+    With session coordination the offset lives in the shared file so every
+    instance (and every flow in this one) resumes from the same place.
+    """
+    coord = _session_coordinator
+    if coord:
+        return coord.get_shared_offset() + 1
+    return (_telegram_last_update_id or 0) + 1
+
+def _telegram_commit_offset(update_id: int) -> None:
+    """Record ``update_id`` as handled, in the store ``_telegram_next_offset`` reads.
+
+    Both stores only move forward, so committing an older id is a no-op.
+    """
+    coord = _session_coordinator
+    if coord:
+        coord.set_shared_offset(update_id)
+    else:
+        _telegram_bump_offset(update_id)
+
+def _telegram_poll_updates(backoff: float = 1.0) -> tuple:
+    """Long-poll getUpdates once from the shared offset.
+
+    Every poll in the process goes through here so they all use the same offset
+    store and update filter (allowed_updates is sticky on Telegram's side).
+    Returns ``(updates, next_backoff)``: on a network/API error this sleeps
+    ``backoff`` seconds and returns no updates with the delay doubled (capped
+    at 30 s); a successful poll resets it to 1 s.
+    """
+    try:
+        response = _telegram_api_call(
+            "getUpdates",
+            {
+                "offset": _telegram_next_offset(),
+                "timeout": 50,
+                "allowed_updates": TELEGRAM_ALLOWED_UPDATES,
+            },
+            timeout=60,
+        )
+    except Exception:
+        time.sleep(backoff)
+        return [], min(backoff * 2, 30.0)
+    return response.get("result", []), 1.0
+
 def _telegram_init_offset() -> None:
-    """Initialize update offset so old messages are ignored on first use."""
+    """Initialize update offset so old messages are ignored on first use.
+
+    Resumes from the persisted offset when there is one; only a first run
+    needs the bootstrap getUpdates call. The lock only keeps two threads from
+    bootstrapping at the same time.
+    """
     global _telegram_last_update_id
     with _telegram_lock:
         if _telegram_last_update_id is not None:
             return
+        persisted = _telegram_load_offset()
+        if persisted is not None:
+            _telegram_last_update_id = persisted
+            return
         try:
-            updates = _telegram_api_call("getUpdates", {"timeout": 0, "limit": 100}, timeout=10)
+            updates = _telegram_api_call("getUpdates", _telegram_bootstrap_query(), timeout=10)
             result = updates.get("result", [])
             if result:
                 _telegram_last_update_id = max(item.get("update_id", 0) for item in result)
+                _telegram_save_offset(_telegram_last_update_id)
             else:
                 _telegram_last_update_id = 0
         except Exception:
@@ -739,36 +1194,70 @@ def _telegram_init_offset() -> None:
 
 # ── Telegram Photo Download ─────────────────────────────────────────────────
 
+# file_id → file_path from getFile, bounded LRU. A plain dict rather than
+# lru_cache so an expired path can be evicted on its own.
+_TELEGRAM_FILE_PATH_CACHE_MAX = 128
+_telegram_file_paths: "OrderedDict[str, str]" = OrderedDict()
+_telegram_file_paths_lock = threading.Lock()
+
+def _telegram_file_path(file_id: str) -> str:
+    """Server-side file_path for ``file_id`` via getFile; repeats of a file skip the call."""
+    with _telegram_file_paths_lock:
+        file_path = _telegram_file_paths.get(file_id)
+        if file_path is not None:
+            _telegram_file_paths.move_to_end(file_id)
+            return file_path
+    result = _telegram_api_call("getFile", {"file_id": file_id})
+    file_path = result.get("result", {}).get("file_path")
+    if not file_path:
+        raise RuntimeError(f"Telegram API getFile returned no file_path for {file_id}")
+    with _telegram_file_paths_lock:
+        _telegram_file_paths[file_id] = file_path
+        if len(_telegram_file_paths) > _TELEGRAM_FILE_PATH_CACHE_MAX:
+            _telegram_file_paths.popitem(last=False)
+    return file_path
+
+
+def _telegram_download_file(file_id: str, timeout: float = 60) -> tuple:
+    """Fetch a Telegram file by file_id over the pooled Bot API connection.
+
+    Returns (data, file_path, content_type); content_type is the bare MIME
+    type from the response headers, or "" when the server did not send one.
+    """
+    if not _TG_TOKEN:
+        raise RuntimeError("HITL_TELEGRAM_BOT_TOKEN is not set")
+    # Step 1: getFile to obtain the file_path on Telegram's server (cached)
+    file_path = _telegram_file_path(file_id)
+    # Step 2: Download the actual file bytes (same keep-alive connection)
+    status, headers, data = _telegram_request("GET", f"/file/bot{_TG_TOKEN}/{file_path}", None, {}, timeout)
+    if status == 404:
+        # Download links expire after an hour or so — resolve a fresh one once
+        with _telegram_file_paths_lock:
+            _telegram_file_paths.pop(file_id, None)
+        file_path = _telegram_file_path(file_id)
+        status, headers, data = _telegram_request("GET", f"/file/bot{_TG_TOKEN}/{file_path}", None, {}, timeout)
+    if status != 200:
+        raise RuntimeError(f"HTTP {status} downloading {file_path}")
+    content_type = (headers.get("Content-Type") or "").partition(";")[0].strip().lower()
+    return data, file_path, content_type
+
+
 def _telegram_download_photo(file_id: str) -> tuple:
     """Download a photo from Telegram by file_id.
 
     Returns (image_bytes, mime_type).
     """
-    token = os.getenv("HITL_TELEGRAM_BOT_TOKEN", "").strip()
-    if not token:
-        raise RuntimeError("HITL_TELEGRAM_BOT_TOKEN is not set")
-    # Step 1: getFile to obtain the file_path on Telegram's server
-    result = _telegram_api_call("getFile", {"file_id": file_id})
-    file_path = result.get("result", {}).get("file_path")
-    if not file_path:
-        raise RuntimeError(f"Telegram API getFile returned no file_path for {file_id}")
-    # Step 2: Download the actual file bytes
-    url = f"https://api.telegram.org/file/bot{token}/{file_path}"
-    req = urllib.request.Request(url)
     try:
-        with urllib.request.urlopen(req, timeout=60) as resp:
-            data = resp.read()
-    except (urllib.error.HTTPError, urllib.error.URLError, OSError) as e:
+        data, file_path, content_type = _telegram_download_file(file_id)
+    except (http.client.HTTPException, OSError) as e:
         raise RuntimeError(f"Failed to download photo {file_id}: {e}") from e
-    # Determine MIME type from file extension
-    ext = os.path.splitext(file_path)[1].lower()
-    mime_map = {
-        ".jpg": "image/jpeg", ".jpeg": "image/jpeg",
-        ".png": "image/png", ".gif": "image/gif",
-        ".webp": "image/webp", ".bmp": "image/bmp",
-    }
-    mime_type = mime_map.get(ext, "image/jpeg")
-    return data, mime_type
+    # Trust the server's Content-Type when it names an image; Telegram's file
+    # endpoint may answer with a generic type, so fall back to the extension.
+    if content_type.startswith("image/"):
+        return data, content_type
+    # Telegram file paths look like "photos/file_12.jpg"
+    ext = file_path.rpartition(".")[2].lower()
+    return data, _IMAGE_MIME_MAP.get("." + ext, "image/jpeg")
 
 
 def is_ocr_enabled() -> bool:
@@ -777,6 +1266,23 @@ def is_ocr_enabled() -> bool:
     return value not in {"0", "false", "no", "off"}
 
 
+def _get_ocr_engine():
+    """Import the OCR stack and build the engine on first use; None if unavailable."""
+    global np, RapidOCR, _OCR_ENGINE, _OCR_IMPORTED
+    if _OCR_ENGINE is None and _OCR_IMPORTED:
+        with _ocr_engine_lock:
+            if _OCR_ENGINE is None and _OCR_IMPORTED:
+                try:
+                    import numpy as _np
+                    from rapidocr_onnxruntime import RapidOCR as _RapidOCR
+                    np, RapidOCR = _np, _RapidOCR
+                    _OCR_ENGINE = RapidOCR()
+                except Exception as e:
+                    logging.getLogger("hitl-mcp").warning("OCR engine unavailable: %s", e)
+                    _OCR_IMPORTED = False
+    return _OCR_ENGINE
+
+
 def _extract_ocr_from_image_bytes(image_bytes: bytes) -> Dict[str, Any]:
     """Extract text from image bytes using RapidOCR (if available)."""
     if not is_ocr_enabled():
@@ -788,7 +1294,8 @@ def _extract_ocr_from_image_bytes(image_bytes: bytes) -> Dict[str, Any]:
             "ocr_avg_confidence": None,
         }
 
-    if not _OCR_IMPORTED or _OCR_ENGINE is None:
+    engine = _get_ocr_engine()
+    if engine is None:
         return {
             "ocr_enabled": True,
             "ocr_available": False,
@@ -800,7 +1307,7 @@ def _extract_ocr_from_image_bytes(image_bytes: bytes) -> Dict[str, Any]:
     try:
         image = PILImage.open(io.BytesIO(image_bytes)).convert("RGB")
         image_np = np.asarray(image)
-        ocr_result, _ = _OCR_ENGINE(image_np)
+        ocr_result, _ = engine(image_np)
 
         lines: List[Dict[str, Any]] = []
         if ocr_result:
@@ -839,6 +1346,48 @@ def _extract_ocr_from_image_bytes(image_bytes: bytes) -> Dict[str, Any]:
 
 # ── Image tools helpers ──
 
+
+def _telegram_fetch_image_envelope(
+    file_id: str,
+    caption: str,
+    width: Optional[int] = None,
+    height: Optional[int] = None,
+    mime_type: Optional[str] = None,
+) -> tuple:
+    """Download a Telegram image and wrap it in the JSON reply get_multiline_input detects.
+
+    Returns (envelope, file_size, ocr_text). The raw bytes are released as soon
+    as they are base64-encoded, and the encoded data is spliced into the JSON
+    text (base64 needs no escaping), so the image never sits in memory as raw
+    bytes, base64 and JSON all at once. OCR (native code that releases the
+    GIL) runs on the I/O pool while this thread does the encoding.
+    """
+    image_bytes, detected_mime = _telegram_download_photo(file_id)
+    file_size = len(image_bytes)
+    if is_ocr_enabled():
+        ocr_future = _telegram_io_pool.submit(_extract_ocr_from_image_bytes, image_bytes)
+    else:
+        ocr_future = None
+    image_b64 = base64.b64encode(image_bytes)
+    del image_bytes
+    # With OCR off the extractor returns its fixed "disabled" metadata straight away
+    ocr_meta = ocr_future.result() if ocr_future else _extract_ocr_from_image_bytes(b"")
+    head = _json_dumps_bytes({
+        "__image__": True,
+        "caption": caption,
+        "mime_type": mime_type or detected_mime,
+        "file_size": file_size,
+        "width": width,
+        "height": height,
+        "ocr_enabled": ocr_meta.get("ocr_enabled", False),
+        "ocr_available": ocr_meta.get("ocr_available", False),
+        "ocr_text": ocr_meta.get("ocr_text", ""),
+        "ocr_lines": ocr_meta.get("ocr_lines", []),
+        "ocr_avg_confidence": ocr_meta.get("ocr_avg_confidence"),
+    }).decode("utf-8")
+    envelope = "".join((head[:-1], ',"image_b64":"', image_b64.decode("ascii"), '"}'))
+    return envelope, file_size, ocr_meta.get("ocr_text", "")
+
 def is_image_tools_enabled() -> bool:
     """Check whether local image viewing tools (get_image, list_images) are enabled."""
     value = os.getenv("HITL_IMAGE_TOOLS_ENABLED", "true").strip().lower()
@@ -1169,6 +1718,52 @@ def _capture_window_screenshot(window_title_contains: str, max_size: int = 1400)
 
 # ── Whispr: voice-message confirmation flow ────────────────────────────────
 
+# Approve / edit / cancel buttons for the transcription review, serialized once
+_WHISPR_CONFIRM_KEYBOARD_JSON = _json_dumps_bytes({"inline_keyboard": [
+    [
+        {"text": "✅ Yes, proceed", "callback_data": "whispr:approve"},
+        {"text": "✏️ Edit", "callback_data": "whispr:edit"},
+    ],
+    [
+        {"text": "❌ Cancel", "callback_data": "whispr:cancel"},
+    ],
+]}).decode("utf-8")
+
+def _whispr_show_confirmation(chat_id: str, text: str, message_id: Optional[int]) -> Optional[int]:
+    """Show *text* with the approve/edit/cancel keyboard; returns the message id.
+
+    A later round edits the earlier confirmation message in place instead of
+    posting a new one; if the edit is rejected a fresh message is sent.
+    """
+    payloads = [
+        {
+            "chat_id": chat_id,
+            "text": f"🎙 **Transcribed text:**\n\n{text}\n\n─────────────────────\nIs this correct?",
+            "parse_mode": "Markdown",
+            "reply_markup": _WHISPR_CONFIRM_KEYBOARD_JSON,
+        },
+        # Markdown might fail if text has special chars — plain variant
+        {
+            "chat_id": chat_id,
+            "text": f"🎙 Transcribed text:\n\n{text}\n\n─────────────────────\nIs this correct?",
+            "reply_markup": _WHISPR_CONFIRM_KEYBOARD_JSON,
+        },
+    ]
+    if message_id is not None:
+        for payload in payloads:
+            try:
+                _telegram_api_call("editMessageText", {**payload, "message_id": message_id}, timeout=15)
+                return message_id
+            except Exception as exc:
+                if "message is not modified" in str(exc):
+                    return message_id
+    try:
+        sent = _telegram_api_call("sendMessage", payloads[0], timeout=15)
+    except Exception:
+        sent = _telegram_api_call("sendMessage", payloads[1], timeout=15)
+    return sent.get("result", {}).get("message_id")
+
+
 def _whispr_handle_voice_message(msg: Dict[str, Any], chat_id: str) -> Optional[str]:
     """Download, transcribe, and run confirmation loop for a voice message.
 
@@ -1215,17 +1810,19 @@ def _whispr_handle_voice_message(msg: Dict[str, Any], chat_id: str) -> Optional[
     if not file_id:
         return None
 
-    bot_token = os.getenv("HITL_TELEGRAM_BOT_TOKEN", "").strip()
-
-    # Notify user we're processing
-    _telegram_api_call("sendMessage", {
+    # Notify user we're processing; the notice goes out on the I/O pool while
+    # this thread already downloads and transcribes the audio.
+    notice_future = _telegram_io_pool.submit(_telegram_api_call, "sendMessage", {
         "chat_id": chat_id,
         "text": f"🎙 Transcribing voice message ({duration}s)…",
     }, timeout=10)
 
     # Download and transcribe
     try:
-        audio_path = whispr_download_voice(file_id, bot_token)
+        audio_bytes, file_path, _ = _telegram_download_file(file_id)
+        with tempfile.NamedTemporaryFile(suffix=os.path.splitext(file_path)[1] or ".ogg", delete=False) as tmp:
+            tmp.write(audio_bytes)
+        audio_path = tmp.name
         try:
             transcriber = whispr_get_transcriber()
             transcribed_text = transcriber.transcribe(audio_path)
@@ -1236,11 +1833,14 @@ def _whispr_handle_voice_message(msg: Dict[str, Any], chat_id: str) -> Optional[
             except Exception:
                 pass
     except Exception as exc:
+        notice_future.result()
         _telegram_api_call("sendMessage", {
             "chat_id": chat_id,
             "text": f"❌ Whispr transcription failed: {exc}",
         }, timeout=10)
         return None
+    # Keep the notice ahead of anything the flow sends next
+    notice_future.result()
 
     if not transcribed_text.strip():
         _telegram_api_call("sendMessage", {
@@ -1267,41 +1867,11 @@ def _whispr_handle_voice_message(msg: Dict[str, Any], chat_id: str) -> Optional[
     original_text = current_text
     edit_history: list[str] = []
 
+    confirm_message_id: Optional[int] = None
+
     while True:
-        # Send confirmation message with buttons
-        confirm_msg = (
-            f"🎙 **Transcribed text:**\n\n"
-            f"{current_text}\n\n"
-            f"─────────────────────\n"
-            f"Is this correct?"
-        )
-        keyboard = [
-            [
-                {"text": "✅ Yes, proceed", "callback_data": "whispr:approve"},
-                {"text": "✏️ Edit", "callback_data": "whispr:edit"},
-            ],
-            [
-                {"text": "❌ Cancel", "callback_data": "whispr:cancel"},
-            ],
-        ]
-        confirm_payload: Dict[str, Any] = {
-            "chat_id": chat_id,
-            "text": confirm_msg,
-            "parse_mode": "Markdown",
-            "reply_markup": json.dumps({"inline_keyboard": keyboard}),
-        }
-        try:
-            _telegram_api_call("sendMessage", confirm_payload, timeout=15)
-        except Exception:
-            # Markdown might fail if text has special chars, retry without parse_mode
-            confirm_payload.pop("parse_mode", None)
-            confirm_payload["text"] = (
-                f"🎙 Transcribed text:\n\n"
-                f"{current_text}\n\n"
-                f"─────────────────────\n"
-                f"Is this correct?"
-            )
-            _telegram_api_call("sendMessage", confirm_payload, timeout=15)
+        # Show the confirmation with buttons (edited in place after the first round)
+        confirm_message_id = _whispr_show_confirmation(chat_id, current_text, confirm_message_id)
 
         # Wait for user response (button tap or text message)
         response = _whispr_wait_for_response(chat_id)
@@ -1315,12 +1885,12 @@ def _whispr_handle_voice_message(msg: Dict[str, Any], chat_id: str) -> Optional[
                 "chat_id": chat_id,
                 "text": "✅ Transcription approved. Sending to agent…",
             }, timeout=10)
-            return json.dumps({
+            return _json_dumps_bytes({
                 "__whispr__": True,
                 "text": current_text,
                 "original": original_text,
                 "edits": edit_history,
-            })
+            }).decode("utf-8")
 
         elif response == "__WHISPR_CANCEL__":
             _telegram_api_call("sendMessage", {
@@ -1368,6 +1938,13 @@ def _whispr_handle_voice_message(msg: Dict[str, Any], chat_id: str) -> Optional[
             continue
 
 
+# Whispr confirmation buttons → (callback answer, sentinel returned to the flow)
+_WHISPR_CALLBACK_REPLIES = {
+    "whispr:approve": ("✅ Approved!", "__WHISPR_APPROVE__"),
+    "whispr:edit": ("✏️ Send your corrections", "__WHISPR_EDIT__"),
+    "whispr:cancel": ("❌ Cancelled", "__WHISPR_CANCEL__"),
+}
+
 def _whispr_wait_for_response(chat_id: str, timeout_seconds: int = 300) -> Optional[str]:
     """Wait for a user response (callback or text) in the Whispr flow.
 
@@ -1378,319 +1955,334 @@ def _whispr_wait_for_response(chat_id: str, timeout_seconds: int = 300) -> Optio
         - The text content if user sent a text message
         - None on timeout
     """
-    global _telegram_last_update_id
     start = time.time()
+    backoff = 1.0
 
     while time.time() - start < timeout_seconds:
-        try:
-            with _telegram_lock:
-                offset = (_telegram_last_update_id or 0) + 1
-            updates = _telegram_api_call(
-                "getUpdates",
-                {"offset": offset, "timeout": 15, "allowed_updates": ["message", "callback_query"]},
-                timeout=25,
-            )
-        except Exception:
-            time.sleep(1)
+        result, backoff = _telegram_poll_updates(backoff)
+        if not result:
             continue
 
-        for item in updates.get("result", []):
-            update_id = item.get("update_id", 0)
-            with _telegram_lock:
-                _telegram_last_update_id = max(_telegram_last_update_id or 0, update_id)
-
-            # Check callback queries (button taps)
-            cb = item.get("callback_query")
-            if cb:
-                cb_data = cb.get("data", "")
-                cb_id = cb.get("id")
-                if cb_data == "whispr:approve":
-                    try:
-                        _telegram_api_call("answerCallbackQuery", {
-                            "callback_query_id": cb_id, "text": "✅ Approved!", "show_alert": False,
-                        }, timeout=10)
-                    except Exception:
-                        pass
-                    return "__WHISPR_APPROVE__"
-                elif cb_data == "whispr:edit":
-                    try:
-                        _telegram_api_call("answerCallbackQuery", {
-                            "callback_query_id": cb_id, "text": "✏️ Send your corrections", "show_alert": False,
-                        }, timeout=10)
-                    except Exception:
-                        pass
-                    return "__WHISPR_EDIT__"
-                elif cb_data == "whispr:cancel":
-                    try:
-                        _telegram_api_call("answerCallbackQuery", {
-                            "callback_query_id": cb_id, "text": "❌ Cancelled", "show_alert": False,
-                        }, timeout=10)
-                    except Exception:
-                        pass
-                    return "__WHISPR_CANCEL__"
-                # Other callback (session switching etc.) — ignore in whispr flow
-                continue
+        # Pre-extract (update_id, callback, message) once, then pick the first
+        # update the flow cares about: a Whispr button tap or a text message.
+        entries = [
+            (item.get("update_id", 0), item.get("callback_query"), item.get("message") or {})
+            for item in result
+        ]
+        match = next(
+            (
+                entry for entry in entries
+                if (entry[1] and entry[1].get("data") in _WHISPR_CALLBACK_REPLIES)
+                or (entry[2].get("text") and _telegram_chat_id_matches(entry[2].get("chat", {}).get("id")))
+            ),
+            None,
+        )
+        if match is None:
+            # Nothing for us (other callbacks, other chats) — consume the batch
+            _telegram_commit_offset(max(entry[0] for entry in entries))
+            continue
 
-            # Check text messages
-            msg = item.get("message")
-            if msg and _telegram_chat_id_matches(msg.get("chat", {}).get("id")):
-                text = msg.get("text")
-                if text:
-                    return text
+        update_id, cb, msg = match
+        _telegram_commit_offset(update_id)
+        if cb:
+            answer_text, sentinel = _WHISPR_CALLBACK_REPLIES[cb["data"]]
+            try:
+                _telegram_api_call("answerCallbackQuery", {
+                    "callback_query_id": cb.get("id"), "text": answer_text, "show_alert": False,
+                }, timeout=10)
+            except Exception:
+                pass
+            return sentinel
+        return msg["text"]
 
     return None  # timeout
 
 
 # ── Whispr command handlers ────────────────────────────────────────────────
 
+_WHISPR_NOT_FOUND_TEXT = (
+    "🎙 **Whispr module not found.**\n\n"
+    "Install faster-whisper to enable voice transcription:\n"
+    "`pip install faster-whisper`"
+)
+
+_WHISPR_COMMANDS_HELP = (
+    "Commands:\n"
+    "/whispr_on — Enable transcription\n"
+    "/whispr_off — Disable transcription\n"
+    "/whispr model <name> — Change model\n"
+    "/whispr lang <code> — Set language filter\n"
+    "/whispr languages en,ru,fr — Set your languages\n"
+    "/whispr prompt <text> — Manual prompt override\n"
+    "/whispr beam <n> — Set beam size (1-20)"
+)
+
+
+def _whispr_send(chat_id: str, text: str, **extra: Any) -> None:
+    _telegram_api_call("sendMessage", {"chat_id": chat_id, "text": text, **extra}, timeout=10)
+
+
+def _whispr_cmd_on(cfg: Any, arg: str, chat_id: str) -> None:
+    if not whispr_is_available():
+        _whispr_send(chat_id, "🎙 Setting up Whispr (installing dependencies & downloading model)...\nThis may take a minute.")
+        ready = whispr_ensure_ready()
+        if not ready["success"]:
+            _whispr_send(chat_id, f"❌ Whispr setup failed: {ready['message']}")
+            return
+    cfg.enabled = True
+    _whispr_send(chat_id, (
+        f"✅ Whispr enabled!\n\n"
+        f"Model: {cfg.model}\n"
+        f"Language: {cfg.language or 'auto-detect'}\n\n"
+        f"Send a voice message to try it out.\n\n"
+        f"/whispr_off — Disable"
+    ))
+
+
+def _whispr_cmd_off(cfg: Any, arg: str, chat_id: str) -> None:
+    cfg.enabled = False
+    _whispr_send(chat_id, "🔇 Whispr disabled. Voice messages will be ignored.\n\n/whispr_on — Re-enable")
+
+
+def _whispr_cmd_model(cfg: Any, arg: str, chat_id: str) -> None:
+    if arg:
+        cfg.model = arg
+        _whispr_send(chat_id, f"✅ Whispr model set to: {arg}\n(Will load on next transcription)")
+    else:
+        _whispr_send(chat_id, (
+            f"Current model: {cfg.model}\n\n"
+            "Available: tiny, base, small, medium, large-v3\n"
+            "Usage: /whispr model small"
+        ))
+
+
+def _whispr_cmd_languages(cfg: Any, arg: str, chat_id: str) -> None:
+    if not arg:
+        current = ", ".join(cfg.languages) if cfg.languages else "(not set)"
+        _whispr_send(chat_id, (
+            f"Current languages: {current}\n\n"
+            "Set your languages to auto-generate prompts that improve transcription accuracy.\n\n"
+            "Usage: /whispr languages en,ru,fr\n"
+            "Clear: /whispr languages clear"
+        ))
+        return
+    if arg in ("none", "clear", "off"):
+        cfg.languages = []
+        cfg.languages_asked = True
+        _whispr_send(chat_id, "✅ Language list cleared. Auto-detect will be used.")
+        return
+    langs = [l.strip() for l in arg.replace(" ", ",").split(",") if l.strip()]
+    cfg.languages = langs
+    cfg.languages_asked = True
+    from whispr import LANGUAGE_PRIMERS
+    unknown = [l for l in langs if l not in LANGUAGE_PRIMERS]
+    prompt = cfg.get_effective_prompt()
+    msg = f"✅ Languages set: {', '.join(langs)}"
+    if prompt:
+        msg += f"\n\nAuto-generated primer: \"{prompt}\""
+    if unknown:
+        msg += f"\n⚠️ No primer phrases for: {', '.join(unknown)}"
+    _whispr_send(chat_id, msg)
+
+
+def _whispr_cmd_lang(cfg: Any, arg: str, chat_id: str) -> None:
+    if arg:
+        new_lang = "" if arg == "auto" else arg
+        cfg.language = new_lang
+        _whispr_send(chat_id, f"✅ Whispr language set to: {new_lang or 'auto-detect'}")
+    else:
+        _whispr_send(chat_id, (
+            f"Current language: {cfg.language or 'auto-detect'}\n\n"
+            "Usage: /whispr lang en  (or ru, de, fr, auto)"
+        ))
+
+
+def _whispr_cmd_prompt(cfg: Any, arg: str, chat_id: str) -> None:
+    if not arg:
+        current = cfg.initial_prompt or "(none)"
+        _whispr_send(chat_id, (
+            f"Current initial prompt: {current}\n\n"
+            "Set a text snippet in the expected language to improve recognition.\n"
+            "Examples:\n"
+            "  /whispr prompt Привет, как дела?  (for Russian)\n"
+            "  /whispr prompt Bonjour, comment ça va?  (for French)\n"
+            "  /whispr prompt clear  (remove prompt)"
+        ))
+    elif arg in ("none", "clear", "off"):
+        cfg.initial_prompt = ""
+        _whispr_send(chat_id, "✅ Whispr initial prompt cleared.")
+    else:
+        cfg.initial_prompt = arg
+        _whispr_send(chat_id, f"✅ Whispr initial prompt set to: {arg}\n\n(Helps prime the decoder for expected language/context)")
+
+
+def _whispr_cmd_beam(cfg: Any, arg: str, chat_id: str) -> None:
+    if not arg.isdigit():
+        _whispr_send(chat_id, (
+            f"Current beam size: {cfg.beam_size}\n\n"
+            "Higher = better accuracy but slower (1-20)\n"
+            "Usage: /whispr beam 10"
+        ))
+        return
+    new_beam = int(arg)
+    if 1 <= new_beam <= 20:
+        cfg.beam_size = new_beam
+        _whispr_send(chat_id, f"✅ Whispr beam size set to: {new_beam}\n(Higher = better accuracy, slower)")
+    else:
+        _whispr_send(chat_id, "❌ Beam size must be between 1 and 20.")
+
+
+def _whispr_cmd_status(cfg: Any, arg: str, chat_id: str) -> None:
+    available = whispr_is_available()
+    _whispr_send(chat_id, (
+        f"🎙 **Whispr Status**\n\n"
+        f"Available: {'✅ Yes' if available else '❌ No (install faster-whisper)'}\n"
+        f"Enabled: {'✅ On' if cfg.enabled else '🔇 Off'}\n"
+        f"Model: {cfg.model}\n"
+        f"Language filter: {cfg.language or 'auto-detect'}\n"
+        f"My languages: {', '.join(cfg.languages) if cfg.languages else '(not set)'}\n"
+        f"Beam size: {cfg.beam_size}\n"
+        f"VAD filter: {'✅ On' if cfg.vad_filter else '❌ Off'}\n"
+        f"Active prompt: {cfg.get_effective_prompt() or '(none)'}\n\n"
+        + _WHISPR_COMMANDS_HELP
+    ), parse_mode="Markdown")
+
+
+# /whispr sub-command → handler(cfg, argument, chat_id); unknown verbs show the status
+_WHISPR_HANDLERS = {
+    "on": _whispr_cmd_on,
+    "enable": _whispr_cmd_on,
+    "off": _whispr_cmd_off,
+    "disable": _whispr_cmd_off,
+    "model": _whispr_cmd_model,
+    "languages": _whispr_cmd_languages,
+    "lang": _whispr_cmd_lang,
+    "prompt": _whispr_cmd_prompt,
+    "beam": _whispr_cmd_beam,
+    "status": _whispr_cmd_status,
+}
+
+
 def _handle_whispr_command(text: str, chat_id: str) -> None:
-    """Handle /whispr commands (on, off, status, model)."""
-    parts = text.split(maxsplit=1)
-    subcmd = parts[1].strip().lower() if len(parts) > 1 else "status"
+    """Handle /whispr commands (on, off, status, model, ...)."""
+    parts = text.lower().split(maxsplit=2)
+    # In group chats the shortcut arrives as /whispr_on@BotName, which the
+    # caller turns into "/whispr on@botname": drop the @mention from the verb
+    verb = parts[1].partition("@")[0] if len(parts) > 1 else "status"
+    arg = parts[2] if len(parts) > 2 else ""
 
     if not _WHISPR_IMPORTED:
-        _telegram_api_call("sendMessage", {
-            "chat_id": chat_id,
-            "text": (
-                "🎙 **Whispr module not found.**\n\n"
-                "Install faster-whisper to enable voice transcription:\n"
-                "`pip install faster-whisper`"
-            ),
-            "parse_mode": "Markdown",
-        }, timeout=10)
+        _whispr_send(chat_id, _WHISPR_NOT_FOUND_TEXT, parse_mode="Markdown")
         return
 
-    cfg = whispr_get_config()
+    _WHISPR_HANDLERS.get(verb, _whispr_cmd_status)(whispr_get_config(), arg.strip(), chat_id)
+
+
+_HELP_TEXT = (
+    "🤖 **HITL MCP Server — Commands**\n\n"
+    "📋 /sessions — List active agent sessions\n"
+    "📝 /r{n} — Reply to session #n\n"
+    "🎙 /whispr — Voice transcription settings\n"
+    "  /whispr_on — Enable Whispr\n"
+    "  /whispr_off — Disable Whispr\n"
+    "  /whispr model <name> — Set model (tiny/base/small/medium/large-v3)\n"
+    "  /whispr lang <code> — Set language (en/ru/auto)\n"
+    "📷 **Images** — Send a photo or image file and it will be forwarded to the AI model\n"
+    "📝 **OCR** — Text is auto-extracted from images when OCR is enabled (`HITL_OCR_ENABLED=true`)\n"
+    "🖼 **Window screenshots** — Use MCP tool `get_window_screenshot` from the model side\n"
+    "❓ /help — Show this help"
+)
 
-    if subcmd in ("on", "enable"):
-        if not whispr_is_available():
-            _telegram_api_call("sendMessage", {
-                "chat_id": chat_id,
-                "text": "🎙 Setting up Whispr (installing dependencies & downloading model)...\nThis may take a minute.",
-            }, timeout=10)
-            ready = whispr_ensure_ready()
-            if not ready["success"]:
-                _telegram_api_call("sendMessage", {
-                    "chat_id": chat_id,
-                    "text": f"❌ Whispr setup failed: {ready['message']}",
-                }, timeout=10)
-                return
-        cfg.enabled = True
-        _telegram_api_call("sendMessage", {
-            "chat_id": chat_id,
-            "text": (
-                f"✅ Whispr enabled!\n\n"
-                f"Model: {cfg.model}\n"
-                f"Language: {cfg.language or 'auto-detect'}\n\n"
-                f"Send a voice message to try it out.\n\n"
-                f"/whispr_off — Disable"
-            ),
-        }, timeout=10)
 
-    elif subcmd in ("off", "disable"):
-        cfg.enabled = False
-        _telegram_api_call("sendMessage", {
-            "chat_id": chat_id,
-            "text": "🔇 Whispr disabled. Voice messages will be ignored.\n\n/whispr_on — Re-enable",
-        }, timeout=10)
+def _handle_help_command(chat_id: str) -> None:
+    """Handle /help command with full command list including Whispr."""
+    text = _HELP_TEXT
+    if _WHISPR_IMPORTED:
+        status = "✅ ON" if whispr_get_config().enabled else "🔇 OFF"
+        text += f"\n\n🎙 **Whispr** (voice transcription): {status}"
+    _telegram_api_call("sendMessage", {"chat_id": chat_id, "text": text, "parse_mode": "Markdown"}, timeout=10)
 
-    elif subcmd.startswith("model"):
-        model_parts = subcmd.split(maxsplit=1)
-        if len(model_parts) > 1:
-            new_model = model_parts[1].strip()
-            cfg.model = new_model
-            _telegram_api_call("sendMessage", {
-                "chat_id": chat_id,
-                "text": f"✅ Whispr model set to: {new_model}\n(Will load on next transcription)",
-            }, timeout=10)
-        else:
-            _telegram_api_call("sendMessage", {
-                "chat_id": chat_id,
-                "text": (
-                    f"Current model: {cfg.model}\n\n"
-                    "Available: tiny, base, small, medium, large-v3\n"
-                    "Usage: /whispr model small"
-                ),
-            }, timeout=10)
 
-    elif subcmd.startswith("languages"):
-        lang_parts = subcmd.split(maxsplit=1)
-        if len(lang_parts) > 1:
-            raw = lang_parts[1].strip()
-            if raw.lower() in ("none", "clear", "off"):
-                cfg.languages = []
-                cfg.languages_asked = True
-                _telegram_api_call("sendMessage", {
-                    "chat_id": chat_id,
-                    "text": "✅ Language list cleared. Auto-detect will be used.",
-                }, timeout=10)
-            else:
-                langs = [l.strip().lower() for l in raw.replace(" ", ",").split(",") if l.strip()]
-                cfg.languages = langs
-                cfg.languages_asked = True
-                from whispr import LANGUAGE_PRIMERS
-                known = [l for l in langs if l in LANGUAGE_PRIMERS]
-                unknown = [l for l in langs if l not in LANGUAGE_PRIMERS]
-                prompt = cfg.get_effective_prompt()
-                msg = f"✅ Languages set: {', '.join(langs)}"
-                if prompt:
-                    msg += f"\n\nAuto-generated primer: \"{prompt}\""
-                if unknown:
-                    msg += f"\n⚠️ No primer phrases for: {', '.join(unknown)}"
-                _telegram_api_call("sendMessage", {
-                    "chat_id": chat_id,
-                    "text": msg,
-                }, timeout=10)
-        else:
-            current = ", ".join(cfg.languages) if cfg.languages else "(not set)"
-            _telegram_api_call("sendMessage", {
-                "chat_id": chat_id,
-                "text": (
-                    f"Current languages: {current}\n\n"
-                    "Set your languages to auto-generate prompts that improve transcription accuracy.\n\n"
-                    "Usage: /whispr languages en,ru,fr\n"
-                    "Clear: /whispr languages clear"
-                ),
-            }, timeout=10)
+# Prompts awaiting a reply in this process, keyed by the sent message_id. Each
+# call polls or waits on its own thread; whichever one is polling hands a reply
+# addressed to another call's prompt over through that call's queue instead of
+# returning it as its own answer.
+_telegram_reply_slots: Dict[int, "queue.Queue[str]"] = {}
+_telegram_reply_slots_lock = threading.Lock()
 
-    elif subcmd.startswith("lang"):
-        lang_parts = subcmd.split(maxsplit=1)
-        if len(lang_parts) > 1:
-            new_lang = lang_parts[1].strip()
-            if new_lang == "auto":
-                new_lang = ""
-            cfg.language = new_lang
-            _telegram_api_call("sendMessage", {
-                "chat_id": chat_id,
-                "text": f"✅ Whispr language set to: {new_lang or 'auto-detect'}",
-            }, timeout=10)
-        else:
-            _telegram_api_call("sendMessage", {
-                "chat_id": chat_id,
-                "text": (
-                    f"Current language: {cfg.language or 'auto-detect'}\n\n"
-                    "Usage: /whispr lang en  (or ru, de, fr, auto)"
-                ),
-            }, timeout=10)
+def _telegram_deliver_to_prompt(reply_to_id: Optional[int], text: str) -> bool:
+    """Queue ``text`` for the in-process prompt ``reply_to_id``; False if none waits on it."""
+    if reply_to_id is None:
+        return False
+    with _telegram_reply_slots_lock:
+        slot = _telegram_reply_slots.get(reply_to_id)
+    if slot is None:
+        return False
+    slot.put(text)
+    return True
 
-    elif subcmd.startswith("prompt"):
-        prompt_parts = subcmd.split(maxsplit=1)
-        if len(prompt_parts) > 1:
-            new_prompt = prompt_parts[1].strip()
-            if new_prompt.lower() in ("none", "clear", "off", ""):
-                cfg.initial_prompt = ""
-                _telegram_api_call("sendMessage", {
-                    "chat_id": chat_id,
-                    "text": "✅ Whispr initial prompt cleared.",
-                }, timeout=10)
-            else:
-                cfg.initial_prompt = new_prompt
-                _telegram_api_call("sendMessage", {
-                    "chat_id": chat_id,
-                    "text": f"✅ Whispr initial prompt set to: {new_prompt}\n\n(Helps prime the decoder for expected language/context)",
-                }, timeout=10)
-        else:
-            current = cfg.initial_prompt or "(none)"
-            _telegram_api_call("sendMessage", {
-                "chat_id": chat_id,
-                "text": (
-                    f"Current initial prompt: {current}\n\n"
-                    "Set a text snippet in the expected language to improve recognition.\n"
-                    "Examples:\n"
-                    "  /whispr prompt Привет, как дела?  (for Russian)\n"
-                    "  /whispr prompt Bonjour, comment ça va?  (for French)\n"
-                    "  /whispr prompt clear  (remove prompt)"
-                ),
-            }, timeout=10)
+def _telegram_flush_acks(pending: List[Dict[str, Any]]) -> Optional[int]:
+    """Send the queued acknowledgement payloads in order and empty the list.
 
-    elif subcmd.startswith("beam"):
-        beam_parts = subcmd.split(maxsplit=1)
-        if len(beam_parts) > 1 and beam_parts[1].strip().isdigit():
-            new_beam = int(beam_parts[1].strip())
-            if 1 <= new_beam <= 20:
-                cfg.beam_size = new_beam
-                _telegram_api_call("sendMessage", {
-                    "chat_id": chat_id,
-                    "text": f"✅ Whispr beam size set to: {new_beam}\n(Higher = better accuracy, slower)",
-                }, timeout=10)
-            else:
-                _telegram_api_call("sendMessage", {
-                    "chat_id": chat_id,
-                    "text": "❌ Beam size must be between 1 and 20.",
-                }, timeout=10)
+    Consecutive plain-text notices (no keyboard or formatting) are coalesced
+    into one message; a payload carrying ``message_id`` edits that message
+    instead. Acknowledgements are best effort: a failed one is skipped, never
+    raised. Returns the message_id of the last message sent or edited.
+    """
+    merged: List[Dict[str, Any]] = []
+    for payload in pending:
+        prev = merged[-1] if merged else None
+        if (
+            prev is not None
+            and prev.keys() == payload.keys() == {"chat_id", "text"}
+            and prev["chat_id"] == payload["chat_id"]
+            and len(prev["text"]) + len(payload["text"]) + 2 <= TELEGRAM_MAX_MESSAGE_LENGTH
+        ):
+            merged[-1] = {"chat_id": prev["chat_id"], "text": prev["text"] + "\n\n" + payload["text"]}
         else:
-            _telegram_api_call("sendMessage", {
-                "chat_id": chat_id,
-                "text": (
-                    f"Current beam size: {cfg.beam_size}\n\n"
-                    "Higher = better accuracy but slower (1-20)\n"
-                    "Usage: /whispr beam 10"
-                ),
-            }, timeout=10)
-
-    else:
-        # Status
-        available = whispr_is_available()
-        enabled = cfg.enabled
-        _telegram_api_call("sendMessage", {
-            "chat_id": chat_id,
-            "text": (
-                f"🎙 **Whispr Status**\n\n"
-                f"Available: {'✅ Yes' if available else '❌ No (install faster-whisper)'}\n"
-                f"Enabled: {'✅ On' if enabled else '🔇 Off'}\n"
-                f"Model: {cfg.model}\n"
-                f"Language filter: {cfg.language or 'auto-detect'}\n"
-                f"My languages: {', '.join(cfg.languages) if cfg.languages else '(not set)'}\n"
-                f"Beam size: {cfg.beam_size}\n"
-                f"VAD filter: {'✅ On' if cfg.vad_filter else '❌ Off'}\n"
-                f"Active prompt: {cfg.get_effective_prompt() or '(none)'}\n\n"
-                f"Commands:\n"
-                f"/whispr_on — Enable transcription\n"
-                f"/whispr_off — Disable transcription\n"
-                f"/whispr model <name> — Change model\n"
-                f"/whispr lang <code> — Set language filter\n"
-                f"/whispr languages en,ru,fr — Set your languages\n"
-                f"/whispr prompt <text> — Manual prompt override\n"
-                f"/whispr beam <n> — Set beam size (1-20)"
-            ),
-            "parse_mode": "Markdown",
-        }, timeout=10)
-
-
-def _handle_help_command(chat_id: str) -> None:
-    """Handle /help command with full command list including Whispr."""
-    whispr_status = ""
-    if _WHISPR_IMPORTED:
-        cfg = whispr_get_config()
-        status = "✅ ON" if cfg.enabled else "🔇 OFF"
-        whispr_status = f"\n\n🎙 **Whispr** (voice transcription): {status}"
-
-    _telegram_api_call("sendMessage", {
-        "chat_id": chat_id,
-        "text": (
-            "🤖 **HITL MCP Server — Commands**\n\n"
-            "📋 /sessions — List active agent sessions\n"
-            "📝 /r{n} — Reply to session #n\n"
-            f"🎙 /whispr — Voice transcription settings\n"
-            f"  /whispr_on — Enable Whispr\n"
-            f"  /whispr_off — Disable Whispr\n"
-            f"  /whispr model <name> — Set model (tiny/base/small/medium/large-v3)\n"
-            f"  /whispr lang <code> — Set language (en/ru/auto)\n"
-            "📷 **Images** — Send a photo or image file and it will be forwarded to the AI model\n"
-            "📝 **OCR** — Text is auto-extracted from images when OCR is enabled (`HITL_OCR_ENABLED=true`)\n"
-            "🖼 **Window screenshots** — Use MCP tool `get_window_screenshot` from the model side\n"
-            "❓ /help — Show this help"
-            f"{whispr_status}"
-        ),
-        "parse_mode": "Markdown",
-    }, timeout=10)
+            merged.append(payload)
+    pending.clear()
 
+    last_id: Optional[int] = None
+    for payload in merged:
+        try:
+            if "message_id" in payload:
+                try:
+                    sent = _telegram_api_call("editMessageText", payload, timeout=10)
+                except Exception:
+                    payload = {k: v for k, v in payload.items() if k != "message_id"}
+                    sent = _telegram_api_call("sendMessage", payload, timeout=10)
+            else:
+                sent = _telegram_api_call("sendMessage", payload, timeout=10)
+            result = sent.get("result")
+            if isinstance(result, dict):
+                last_id = result.get("message_id", last_id)
+        except Exception:
+            pass
+    return last_id
+
+# Non-poller wait: how often the shared state DB is checked for a routed reply
+# (a data_version pragma while nothing changed) and how often it retries the
+# poll lock in case the poller exited.
+_RESPONSE_CHECK_SECONDS = 0.1
+_POLL_LOCK_RETRY_SECONDS = 1.0
+
+# "/r2 some reply" → session number and optional reply body
+_RN_RE = re.compile(r"^/r(\d+)\s*(.*)", re.DOTALL)
+
+# Outgoing prompt layout; only the header, prompt and Whispr footer vary per call
+_TELEGRAM_PROMPT_TEMPLATE = (
+    "{header}\n\n{prompt}\n\n"
+    + MULTILINE_DELINEATOR
+    + "\nReply to this message or tap a button below.\n{footer}"
+)
 
 def _send_and_wait_telegram_multiline_input(
     title: str,
     prompt: str,
     default_value: str = "",
     timeout_seconds: int = 1800,
+    cancel_event: Optional[threading.Event] = None,
 ) -> Optional[str]:
     """Send prompt to Telegram with session tagging and wait for a reply.
 
@@ -1703,16 +2295,18 @@ def _send_and_wait_telegram_multiline_input(
         3. Active context (button tap) → last-tapped session
         4. Single-session fallback
         5. Ambiguous → disambiguation prompt
+
+    Runs in a worker thread. Setting ``cancel_event`` (done when the awaiting
+    tool call is cancelled) stops the wait at the next loop iteration so the
+    thread does not keep polling — and holding the poll lock — for nobody.
     """
     global _telegram_last_update_id, _session_coordinator
     coord = _session_coordinator
 
-    chat_id = os.getenv("HITL_TELEGRAM_CHAT_ID", "").strip()
+    chat_id = _TG_CHAT_ID
     if not chat_id:
         raise RuntimeError("HITL_TELEGRAM_CHAT_ID is not set")
 
-    _telegram_init_offset()
-
     # ── Build tagged message ──
     tag = coord.format_tag() if coord and coord.session_id else ""
     header = tag if tag else title
@@ -1723,30 +2317,34 @@ def _send_and_wait_telegram_multiline_input(
     else:
         whispr_footer = "🎙 Whispr: OFF · /whispr_on"
 
-    message_lines = [
-        header, "",
-        prompt, "",
-        MULTILINE_DELINEATOR,
-        "Reply to this message or tap a button below.",
-        whispr_footer,
-    ]
+    full_text = _TELEGRAM_PROMPT_TEMPLATE.format(header=header, prompt=prompt, footer=whispr_footer)
     if default_value:
-        message_lines.extend(["", "Default value:", default_value])
+        full_text += "\n\nDefault value:\n" + default_value
 
     # ── Send with inline keyboard (auto-splits long messages) ──
-    keyboard = coord.build_inline_keyboard() if coord else []
-    full_text = "\n".join(message_lines)
-    reply_markup = json.dumps({"inline_keyboard": keyboard}) if keyboard else None
+    reply_markup = coord.inline_keyboard_markup() if coord else None
+
+    # The send runs on the I/O pool while this thread bootstraps the update
+    # offsets, so a first call doesn't pay for those round-trips one after another.
+    send_future = _telegram_io_pool.submit(
+        _telegram_send_long_message, chat_id, full_text,
+        reply_markup=reply_markup, timeout=20, parse_mode="HTML",
+    )
+    _telegram_init_offset()
+    # ── Init shared offset for poller ──
+    if coord:
+        coord.init_shared_offset_if_needed()
 
-    sent = _telegram_send_long_message(chat_id, full_text, reply_markup=reply_markup, timeout=20, parse_mode="HTML")
+    sent = send_future.result()
     sent_message_id = sent.get("result", {}).get("message_id")
 
     if coord and sent_message_id:
         coord.record_message(sent_message_id)
 
-    # ── Init shared offset for poller ──
-    if coord:
-        coord.init_shared_offset_if_needed()
+    reply_slot: "queue.Queue[str]" = queue.Queue()
+    if sent_message_id:
+        with _telegram_reply_slots_lock:
+            _telegram_reply_slots[sent_message_id] = reply_slot
 
     start_time = time.time()
     is_poller = coord.try_acquire_poll_lock() if coord else True
@@ -1757,59 +2355,71 @@ def _send_and_wait_telegram_multiline_input(
     # message is held here so that once the user taps a session button the held
     # payload is auto-routed instead of requiring the user to re-send.
     _pending_routed_text: Optional[str] = None
+    backoff = 1.0
+    next_lock_attempt = 0.0
 
     try:
         while True:
             if time.time() - start_time > timeout_seconds:
                 return None
+            if cancel_event is not None and cancel_event.is_set():
+                return None
 
             # ────── POLLER PATH ──────
             if is_poller or not coord:
-                if coord:
-                    offset = coord.get_shared_offset() + 1
-                else:
-                    with _telegram_lock:
-                        offset = (_telegram_last_update_id or 0) + 1
-
+                # A concurrent call in this process may have polled our reply
                 try:
-                    updates = _telegram_api_call(
-                        "getUpdates",
-                        {
-                            "offset": offset,
-                            "timeout": 25,
-                            "allowed_updates": ["message", "edited_message", "callback_query"],
-                        },
-                        timeout=35,
-                    )
-                except Exception:
-                    time.sleep(2)
-                    continue
+                    return reply_slot.get_nowait()
+                except queue.Empty:
+                    pass
 
-                for item in updates.get("result", []):
-                    update_id = item.get("update_id", 0)
-                    if coord:
-                        coord.set_shared_offset(update_id)
-                    else:
-                        with _telegram_lock:
-                            _telegram_last_update_id = max(_telegram_last_update_id or 0, update_id)
-
-                    # ── Callback query (inline-button tap) ──
-                    cb = item.get("callback_query")
-                    if cb:
-                        cb_data = cb.get("data", "")
-                        cb_id = cb.get("id")
-                        if cb_data.startswith("ses:") and coord:
-                            target_sid = cb_data[4:]
-                            coord.set_active_context(target_sid)
-                            sessions = coord.get_active_sessions()
-                            tgt = next((s for s in sessions if s["session_id"] == target_sid), None)
-
-                            # ── Auto-route pending message if held from disambiguation ──
-                            if _pending_routed_text is not None:
-                                held = _pending_routed_text
-                                _pending_routed_text = None
-                                coord.clear_active_context()  # already routed
-                                if target_sid == coord.session_id:
+                updates, backoff = _telegram_poll_updates(backoff)
+
+                # The offset is persisted once per batch rather than per update.
+                # It only ever covers updates handled so far: if we return early,
+                # the rest of the batch stays on Telegram's side for the next poll
+                # (possibly by another session), so nothing is dropped.
+                batch_update_id = None
+                # Outbound notices are collected and sent once the batch is done
+                # (or right before a step that blocks), so routing a reply to its
+                # session never waits on an acknowledgement round-trip.
+                pending_acks: List[Dict[str, Any]] = []
+                # Set once the Whispr flow has polled on its own: it moved the
+                # shared offset past part of this batch, so the rest is re-polled
+                # instead of being processed (and routed) a second time.
+                whispr_handed_off = False
+                try:
+                    for item in updates:
+                        if whispr_handed_off:
+                            break
+                        batch_update_id = item.get("update_id", 0)
+
+                        # ── Callback query (inline-button tap) ──
+                        cb = item.get("callback_query")
+                        if cb:
+                            cb_data = cb.get("data", "")
+                            cb_id = cb.get("id")
+                            if cb_data.startswith("ses:") and coord:
+                                target_sid = cb_data[4:]
+                                coord.set_active_context(target_sid)
+                                tgt = coord.get_session(target_sid)
+
+                                # ── Auto-route pending message if held from disambiguation ──
+                                if _pending_routed_text is not None:
+                                    held = _pending_routed_text
+                                    _pending_routed_text = None
+                                    coord.clear_active_context()  # already routed
+                                    if target_sid == coord.session_id:
+                                        try:
+                                            _telegram_api_call("answerCallbackQuery", {
+                                                "callback_query_id": cb_id,
+                                                "text": f"✅ Routed to #{tgt['number']}" if tgt else "✅ Routed",
+                                                "show_alert": False,
+                                            }, timeout=10)
+                                        except Exception:
+                                            pass
+                                        return held
+                                    coord.write_response(target_sid, held)
                                     try:
                                         _telegram_api_call("answerCallbackQuery", {
                                             "callback_query_id": cb_id,
@@ -1818,273 +2428,275 @@ def _send_and_wait_telegram_multiline_input(
                                         }, timeout=10)
                                     except Exception:
                                         pass
-                                    return held
-                                coord.write_response(target_sid, held)
+                                    if tgt:
+                                        pending_acks.append({
+                                            "chat_id": chat_id,
+                                            "text": f"✅ Message routed to #{tgt['number']} · {tgt['workspace']}.",
+                                        })
+                                    continue
+
+                                ans = (
+                                    f"📝 Now replying to #{tgt['number']} · {tgt['workspace']}. Send your message:"
+                                    if tgt else "Send your message:"
+                                )
                                 try:
                                     _telegram_api_call("answerCallbackQuery", {
-                                        "callback_query_id": cb_id,
-                                        "text": f"✅ Routed to #{tgt['number']}" if tgt else "✅ Routed",
-                                        "show_alert": False,
-                                    }, timeout=10)
-                                    _telegram_api_call("sendMessage", {
-                                        "chat_id": chat_id,
-                                        "text": f"✅ Message routed to #{tgt['number']} · {tgt['workspace']}.",
+                                        "callback_query_id": cb_id, "text": ans, "show_alert": False,
                                     }, timeout=10)
                                 except Exception:
                                     pass
-                                continue
-
-                            ans = (
-                                f"📝 Now replying to #{tgt['number']} · {tgt['workspace']}. Send your message:"
-                                if tgt else "Send your message:"
-                            )
-                            try:
-                                _telegram_api_call("answerCallbackQuery", {
-                                    "callback_query_id": cb_id, "text": ans, "show_alert": False,
-                                }, timeout=10)
-                                _telegram_api_call("sendMessage", {"chat_id": chat_id, "text": ans}, timeout=10)
-                            except Exception:
-                                pass
-                        continue
+                                pending_acks.append({"chat_id": chat_id, "text": ans})
+                            continue
 
-                    # ── Text message ──
-                    msg = item.get("message") or item.get("edited_message")
-                    if not msg:
-                        continue
-                    if not _telegram_chat_id_matches(msg.get("chat", {}).get("id")):
-                        continue
+                        # ── Text message ──
+                        msg = item.get("message") or item.get("edited_message")
+                        if not msg:
+                            continue
+                        if not _telegram_chat_id_matches(msg.get("chat", {}).get("id")):
+                            continue
 
-                    # ── Voice message (Whispr) ──
-                    if msg.get("voice") or msg.get("audio"):
-                        if whispr_is_enabled():
-                            whispr_result = _whispr_handle_voice_message(msg, chat_id)
-                            if whispr_result is not None:
-                                # Route the transcribed text like a normal message
-                                text = whispr_result
-                                # Fall through to normal routing below
+                        # ── Voice message (Whispr) ──
+                        if msg.get("voice") or msg.get("audio"):
+                            if whispr_is_enabled():
+                                # The Whispr flow polls on its own — hand it the current offset
+                                _telegram_commit_offset(batch_update_id)
+                                batch_update_id = None
+                                whispr_handed_off = True
+                                _telegram_flush_acks(pending_acks)
+                                whispr_result = _whispr_handle_voice_message(msg, chat_id)
+                                if whispr_result is not None:
+                                    # Route the transcribed text like a normal message
+                                    text = whispr_result
+                                    # Fall through to normal routing below
+                                else:
+                                    continue  # cancelled or failed
                             else:
-                                continue  # cancelled or failed
-                        else:
-                            _telegram_api_call("sendMessage", {
-                                "chat_id": chat_id,
-                                "text": "🎙 Voice message received. Enable Whispr to auto-transcribe: /whispr_on",
-                            }, timeout=10)
-                            continue
+                                pending_acks.append({
+                                    "chat_id": chat_id,
+                                    "text": "🎙 Voice message received. Enable Whispr to auto-transcribe: /whispr_on",
+                                })
+                                continue
 
-                    # ── Photo message ──
-                    elif msg.get("photo"):
-                        try:
-                            # Telegram sends array of PhotoSize; last = largest
-                            photo_sizes = msg["photo"]
-                            best_photo = photo_sizes[-1]
-                            file_id = best_photo["file_id"]
-                            caption = msg.get("caption", "")
-                            _telegram_api_call("sendMessage", {
-                                "chat_id": chat_id,
-                                "text": "📷 Photo received, downloading...",
-                            }, timeout=10)
-                            image_bytes, mime_type = _telegram_download_photo(file_id)
-                            ocr_meta = _extract_ocr_from_image_bytes(image_bytes)
-                            image_b64 = base64.b64encode(image_bytes).decode("ascii")
-                            # Encode as JSON payload so get_multiline_input can detect it
-                            text = json.dumps({
-                                "__image__": True,
-                                "caption": caption,
-                                "mime_type": mime_type,
-                                "image_b64": image_b64,
-                                "file_size": len(image_bytes),
-                                "width": best_photo.get("width"),
-                                "height": best_photo.get("height"),
-                                "ocr_enabled": ocr_meta.get("ocr_enabled", False),
-                                "ocr_available": ocr_meta.get("ocr_available", False),
-                                "ocr_text": ocr_meta.get("ocr_text", ""),
-                                "ocr_lines": ocr_meta.get("ocr_lines", []),
-                                "ocr_avg_confidence": ocr_meta.get("ocr_avg_confidence"),
-                            })
-                            if ocr_meta.get("ocr_text"):
-                                preview = ocr_meta["ocr_text"][:280]
-                                _telegram_api_call("sendMessage", {
+                        # ── Photo message ──
+                        elif msg.get("photo"):
+                            try:
+                                # Telegram sends array of PhotoSize; last = largest
+                                photo_sizes = msg["photo"]
+                                best_photo = photo_sizes[-1]
+                                file_id = best_photo["file_id"]
+                                caption = msg.get("caption", "")
+                                # Goes out now, on its own (it is edited below): the
+                                # download may take a while
+                                _telegram_flush_acks(pending_acks)
+                                pending_acks.append({
                                     "chat_id": chat_id,
-                                    "text": f"📝 OCR extracted text:\n{preview}" + ("…" if len(ocr_meta["ocr_text"]) > 280 else ""),
-                                }, timeout=10)
-                            _telegram_api_call("sendMessage", {
-                                "chat_id": chat_id,
-                                "text": f"✅ Photo downloaded ({len(image_bytes)} bytes, {best_photo.get('width')}x{best_photo.get('height')}). Forwarding to model...",
-                            }, timeout=10)
-                            if len(image_bytes) > 5_000_000:
-                                _telegram_api_call("sendMessage", {
+                                    "text": "📷 Photo received, downloading...",
+                                })
+                                progress_id = _telegram_flush_acks(pending_acks)
+                                # Encode as JSON payload so get_multiline_input can detect it
+                                text, file_size, ocr_text = _telegram_fetch_image_envelope(
+                                    file_id, caption, best_photo.get("width"), best_photo.get("height"),
+                                )
+                                if ocr_text:
+                                    pending_acks.append({
+                                        "chat_id": chat_id,
+                                        "text": f"📝 OCR extracted text:\n{ocr_text[:280]}" + ("…" if len(ocr_text) > 280 else ""),
+                                    })
+                                # Turns the "downloading" notice into the result
+                                pending_acks.append({
                                     "chat_id": chat_id,
-                                    "text": f"⚠️ Large image ({len(image_bytes) / 1_000_000:.1f} MB). Some MCP hosts may not handle it.",
-                                }, timeout=10)
-                            # Fall through to normal routing below
-                        except Exception as photo_err:
-                            _telegram_api_call("sendMessage", {
-                                "chat_id": chat_id,
-                                "text": f"❌ Failed to download photo: {photo_err}",
-                            }, timeout=10)
-                            continue
+                                    "text": f"✅ Photo downloaded ({file_size} bytes, {best_photo.get('width')}x{best_photo.get('height')}). Forwarding to model...",
+                                    **({"message_id": progress_id} if progress_id else {}),
+                                })
+                                if file_size > 5_000_000:
+                                    pending_acks.append({
+                                        "chat_id": chat_id,
+                                        "text": f"⚠️ Large image ({file_size / 1_000_000:.1f} MB). Some MCP hosts may not handle it.",
+                                    })
+                                # Fall through to normal routing below
+                            except Exception as photo_err:
+                                pending_acks.append({
+                                    "chat_id": chat_id,
+                                    "text": f"❌ Failed to download photo: {photo_err}",
+                                })
+                                continue
 
-                    # ── Document (file) with image MIME ──
-                    elif msg.get("document") and (msg["document"].get("mime_type", "")).startswith("image/"):
-                        try:
-                            doc = msg["document"]
-                            file_id = doc["file_id"]
-                            caption = msg.get("caption", "")
-                            mime_type = doc.get("mime_type", "image/jpeg")
-                            _telegram_api_call("sendMessage", {
-                                "chat_id": chat_id,
-                                "text": "📷 Image file received, downloading...",
-                            }, timeout=10)
-                            image_bytes, _ = _telegram_download_photo(file_id)
-                            ocr_meta = _extract_ocr_from_image_bytes(image_bytes)
-                            image_b64 = base64.b64encode(image_bytes).decode("ascii")
-                            text = json.dumps({
-                                "__image__": True,
-                                "caption": caption,
-                                "mime_type": mime_type,
-                                "image_b64": image_b64,
-                                "file_size": len(image_bytes),
-                                "width": None,
-                                "height": None,
-                                "ocr_enabled": ocr_meta.get("ocr_enabled", False),
-                                "ocr_available": ocr_meta.get("ocr_available", False),
-                                "ocr_text": ocr_meta.get("ocr_text", ""),
-                                "ocr_lines": ocr_meta.get("ocr_lines", []),
-                                "ocr_avg_confidence": ocr_meta.get("ocr_avg_confidence"),
-                            })
-                            if ocr_meta.get("ocr_text"):
-                                preview = ocr_meta["ocr_text"][:280]
-                                _telegram_api_call("sendMessage", {
+                        # ── Document (file) with image MIME ──
+                        elif msg.get("document") and (msg["document"].get("mime_type", "")).startswith("image/"):
+                            try:
+                                doc = msg["document"]
+                                file_id = doc["file_id"]
+                                caption = msg.get("caption", "")
+                                mime_type = doc.get("mime_type", "image/jpeg")
+                                # Goes out now, on its own (it is edited below): the
+                                # download may take a while
+                                _telegram_flush_acks(pending_acks)
+                                pending_acks.append({
                                     "chat_id": chat_id,
-                                    "text": f"📝 OCR extracted text:\n{preview}" + ("…" if len(ocr_meta["ocr_text"]) > 280 else ""),
-                                }, timeout=10)
-                            _telegram_api_call("sendMessage", {
-                                "chat_id": chat_id,
-                                "text": f"✅ Image downloaded ({len(image_bytes)} bytes). Forwarding to model...",
-                            }, timeout=10)
-                            if len(image_bytes) > 5_000_000:
-                                _telegram_api_call("sendMessage", {
+                                    "text": "📷 Image file received, downloading...",
+                                })
+                                progress_id = _telegram_flush_acks(pending_acks)
+                                text, file_size, ocr_text = _telegram_fetch_image_envelope(
+                                    file_id, caption, mime_type=mime_type,
+                                )
+                                if ocr_text:
+                                    pending_acks.append({
+                                        "chat_id": chat_id,
+                                        "text": f"📝 OCR extracted text:\n{ocr_text[:280]}" + ("…" if len(ocr_text) > 280 else ""),
+                                    })
+                                # Turns the "downloading" notice into the result
+                                pending_acks.append({
                                     "chat_id": chat_id,
-                                    "text": f"⚠️ Large image ({len(image_bytes) / 1_000_000:.1f} MB). Some MCP hosts may not handle it.",
-                                }, timeout=10)
-                        except Exception as doc_err:
-                            _telegram_api_call("sendMessage", {
-                                "chat_id": chat_id,
-                                "text": f"❌ Failed to download image: {doc_err}",
-                            }, timeout=10)
-                            continue
-
-                    else:
-                        text = msg.get("text")
-                        if text is None:
-                            continue
+                                    "text": f"✅ Image downloaded ({file_size} bytes). Forwarding to model...",
+                                    **({"message_id": progress_id} if progress_id else {}),
+                                })
+                                if file_size > 5_000_000:
+                                    pending_acks.append({
+                                        "chat_id": chat_id,
+                                        "text": f"⚠️ Large image ({file_size / 1_000_000:.1f} MB). Some MCP hosts may not handle it.",
+                                    })
+                            except Exception as doc_err:
+                                pending_acks.append({
+                                    "chat_id": chat_id,
+                                    "text": f"❌ Failed to download image: {doc_err}",
+                                })
+                                continue
 
-                    # /whispr command (also /whispr_on, /whispr_off shortcuts)
-                    cmd_lower = text.strip().lower()
-                    if cmd_lower.startswith("/whispr"):
-                        # Convert underscore shortcuts: /whispr_on → /whispr on
-                        normalized = cmd_lower.replace("/whispr_on", "/whispr on").replace("/whispr_off", "/whispr off")
-                        _handle_whispr_command(normalized, chat_id)
-                        continue
+                        else:
+                            text = msg.get("text")
+                            if text is None:
+                                continue
 
-                    # /help command (updated with Whispr info)
-                    if text.strip().lower() == "/help":
-                        _handle_help_command(chat_id)
-                        continue
+                        # Bot command token ("/help@MyBot args" → "/help"); "" for plain text
+                        stripped = text.lstrip()
+                        command = (
+                            stripped[:32].split(None, 1)[0].partition("@")[0].lower()
+                            if stripped.startswith("/") else ""
+                        )
+
+                        # /whispr command (also /whispr_on, /whispr_off shortcuts)
+                        if command.startswith("/whispr"):
+                            cmd_lower = stripped.rstrip().lower()
+                            # Convert underscore shortcuts: /whispr_on → /whispr on
+                            normalized = cmd_lower.replace("/whispr_on", "/whispr on").replace("/whispr_off", "/whispr off")
+                            _telegram_flush_acks(pending_acks)
+                            _handle_whispr_command(normalized, chat_id)
+                            continue
 
-                    # /sessions command
-                    if text.strip().lower() == "/sessions":
-                        sessions = coord.get_active_sessions() if coord else []
-                        if sessions:
-                            lines = ["📋 Active sessions:", ""]
-                            for s in sessions:
-                                lines.append(f"{s['icon']} #{s['number']} · {s['workspace']} (PID {s['pid']})")
-                            _telegram_api_call("sendMessage", {"chat_id": chat_id, "text": "\n".join(lines)}, timeout=10)
-                        else:
-                            _telegram_api_call("sendMessage", {"chat_id": chat_id, "text": "No active sessions."}, timeout=10)
-                        continue
+                        # /help command (updated with Whispr info)
+                        if command == "/help":
+                            _telegram_flush_acks(pending_acks)
+                            _handle_help_command(chat_id)
+                            continue
 
-                    # /r{n} command
-                    rn_match = re.match(r"^/r(\d+)\s*(.*)", text, re.DOTALL)
-                    if rn_match and coord:
-                        target_num = int(rn_match.group(1))
-                        reply_body = rn_match.group(2).strip()
-                        target_sid = coord.session_id_by_number(target_num)
-                        if target_sid and reply_body:
-                            if target_sid == coord.session_id:
-                                _pending_routed_text = None  # explicit /r overrides pending
-                                return reply_body
-                            coord.write_response(target_sid, reply_body)
-                            _pending_routed_text = None
+                        # /sessions command
+                        if command == "/sessions":
+                            sessions = coord.get_active_sessions() if coord else []
+                            if sessions:
+                                listing = "\n".join(
+                                    f"{s['icon']} #{s['number']} · {s['workspace']} (PID {s['pid']})" for s in sessions
+                                )
+                                pending_acks.append({"chat_id": chat_id, "text": f"📋 Active sessions:\n\n{listing}"})
+                            else:
+                                pending_acks.append({"chat_id": chat_id, "text": "No active sessions."})
                             continue
-                        elif target_sid and not reply_body:
-                            # /r{n} with no body — if there's a pending message, route it
-                            if _pending_routed_text is not None:
-                                held = _pending_routed_text
-                                _pending_routed_text = None
+
+                        # /r{n} command
+                        rn_match = (
+                            _RN_RE.match(text) if command.startswith("/r") and command[2:3].isdigit() else None
+                        )
+                        if rn_match and coord:
+                            target_num = int(rn_match.group(1))
+                            reply_body = rn_match.group(2).strip()
+                            target_sid = coord.session_id_by_number(target_num)
+                            if target_sid and reply_body:
                                 if target_sid == coord.session_id:
-                                    return held
-                                coord.write_response(target_sid, held)
-                                _telegram_api_call("sendMessage", {
+                                    _pending_routed_text = None  # explicit /r overrides pending
+                                    return reply_body
+                                coord.write_response(target_sid, reply_body)
+                                _pending_routed_text = None
+                                continue
+                            elif target_sid and not reply_body:
+                                # /r{n} with no body — if there's a pending message, route it
+                                if _pending_routed_text is not None:
+                                    held = _pending_routed_text
+                                    _pending_routed_text = None
+                                    if target_sid == coord.session_id:
+                                        return held
+                                    coord.write_response(target_sid, held)
+                                    pending_acks.append({
+                                        "chat_id": chat_id,
+                                        "text": f"✅ Message routed to #{target_num}.",
+                                    })
+                                    continue
+                                coord.set_active_context(target_sid)
+                                pending_acks.append({
                                     "chat_id": chat_id,
-                                    "text": f"✅ Message routed to #{target_num}.",
-                                }, timeout=10)
+                                    "text": f"📝 Now replying to #{target_num}. Send your message:",
+                                })
+                                continue
+                            else:
+                                pending_acks.append({
+                                    "chat_id": chat_id,
+                                    "text": f"⚠️ Session #{target_num} not found.",
+                                })
                                 continue
-                            coord.set_active_context(target_sid)
-                            _telegram_api_call("sendMessage", {
-                                "chat_id": chat_id,
-                                "text": f"📝 Now replying to #{target_num}. Send your message:",
-                            }, timeout=10)
-                            continue
-                        else:
-                            _telegram_api_call("sendMessage", {
-                                "chat_id": chat_id,
-                                "text": f"⚠️ Session #{target_num} not found.",
-                            }, timeout=10)
-                            continue
 
-                    # Route by reply_to_message_id
-                    reply_to_id = msg.get("reply_to_message", {}).get("message_id")
-                    if reply_to_id and coord:
-                        target_sid = coord.lookup_message(reply_to_id)
-                        if target_sid:
-                            if target_sid == coord.session_id:
-                                return text
-                            coord.write_response(target_sid, text)
-                            continue
+                        # Route by reply_to_message_id
+                        reply_to_id = msg.get("reply_to_message", {}).get("message_id")
+                        if reply_to_id and coord:
+                            target_sid = coord.lookup_message(reply_to_id)
+                            if target_sid:
+                                if target_sid == coord.session_id:
+                                    if reply_to_id != sent_message_id and _telegram_deliver_to_prompt(reply_to_id, text):
+                                        continue
+                                    return text
+                                coord.write_response(target_sid, text)
+                                continue
+
+                        # Route by active context (button tap)
+                        if coord:
+                            ctx_sid = coord.get_and_clear_active_context()
+                            if ctx_sid:
+                                if ctx_sid == coord.session_id:
+                                    return text
+                                coord.write_response(ctx_sid, text)
+                                continue
 
-                    # Route by active context (button tap)
-                    if coord:
-                        ctx_sid = coord.get_and_clear_active_context()
-                        if ctx_sid:
-                            if ctx_sid == coord.session_id:
-                                return text
-                            coord.write_response(ctx_sid, text)
+                        # Exact reply to THIS sent message
+                        if sent_message_id is not None and reply_to_id == sent_message_id:
+                            return text
+                        # ...or to another prompt still waiting in this process
+                        if reply_to_id != sent_message_id and _telegram_deliver_to_prompt(reply_to_id, text):
                             continue
 
-                    # Exact reply to THIS sent message
-                    if sent_message_id is not None and reply_to_id == sent_message_id:
-                        return text
-
-                    # Single session → accept directly
-                    sessions = coord.get_active_sessions() if coord else []
-                    if len(sessions) <= 1:
-                        return text
-
-                    # Multiple sessions, ambiguous → ask
-                    # Hold the message so it auto-routes when the user taps a session button.
-                    _pending_routed_text = text
-                    is_image = text.startswith('{"__image__":') or '"__image__": true' in text[:60]
-                    lines = ["Which session should I route this to?", ""]
-                    for s in sessions:
-                        lines.append(f"  /r{s['number']} — {s['icon']} {s['workspace']}")
-                    lines.append("\nTap a button below to route" + (" the image:" if is_image else ":"))
-                    kb = coord.build_inline_keyboard()
-                    ask_payload: Dict[str, Any] = {"chat_id": chat_id, "text": "\n".join(lines)}
-                    if kb:
-                        ask_payload["reply_markup"] = json.dumps({"inline_keyboard": kb})
-                    _telegram_api_call("sendMessage", ask_payload, timeout=10)
-                    continue
+                        # Single session → accept directly
+                        sessions = coord.get_active_sessions() if coord else []
+                        if len(sessions) <= 1:
+                            return text
+
+                        # Multiple sessions, ambiguous → ask
+                        # Hold the message so it auto-routes when the user taps a session button.
+                        _pending_routed_text = text
+                        is_image = text.startswith('{"__image__":') or '"__image__": true' in text[:60]
+                        choices = "\n".join(f"  /r{s['number']} — {s['icon']} {s['workspace']}" for s in sessions)
+                        kb_markup = coord.inline_keyboard_markup()
+                        ask_payload: Dict[str, Any] = {
+                            "chat_id": chat_id,
+                            "text": (
+                                f"Which session should I route this to?\n\n{choices}\n\n"
+                                f"Tap a button below to route{' the image' if is_image else ''}:"
+                            ),
+                        }
+                        if kb_markup:
+                            ask_payload["reply_markup"] = kb_markup
+                        pending_acks.append(ask_payload)
+                        continue
+                finally:
+                    _telegram_flush_acks(pending_acks)
+                    if batch_update_id is not None:
+                        _telegram_commit_offset(batch_update_id)
+                        batch_update_id = None
 
                 # ── Heartbeat: prove this session is still alive ──
                 if coord:
@@ -2096,170 +2708,269 @@ def _send_and_wait_telegram_multiline_input(
                 if resp is not None:
                     return resp
                 # Try to become poller (in case the original poller exited)
-                if coord and coord.try_acquire_poll_lock():
-                    is_poller = True
-                    continue
-                time.sleep(0.4)
+                now = time.monotonic()
+                if coord and now >= next_lock_attempt:
+                    next_lock_attempt = now + _POLL_LOCK_RETRY_SECONDS
+                    if coord.try_acquire_poll_lock():
+                        is_poller = True
+                        continue
+                # Wait for an in-process hand-off instead of a blind sleep
+                try:
+                    return reply_slot.get(timeout=_RESPONSE_CHECK_SECONDS)
+                except queue.Empty:
+                    pass
     finally:
+        if sent_message_id:
+            with _telegram_reply_slots_lock:
+                _telegram_reply_slots.pop(sent_message_id, None)
         if coord and is_poller:
             coord.release_poll_lock()
 
+
+def _coerce_typed_input(value: str, input_type: str = "text"):
+    """Convert raw input text to the requested type; None if empty or invalid."""
+    if not value:
+        return None
+    if input_type == "integer":
+        try:
+            return int(value)
+        except ValueError:
+            return None
+    if input_type == "float":
+        try:
+            return float(value)
+        except ValueError:
+            return None
+    return value
+
+
+def _telegram_reply_text(reply: str) -> str:
+    """Plain text of a Telegram reply (Whispr transcript or image caption/OCR)."""
+    # Only the Whispr/image envelopes are JSON objects; skip parsing plain text
+    if not reply.startswith("{"):
+        return reply
+    try:
+        parsed = _json_loads_bytes(reply)
+    except (ValueError, TypeError):
+        return reply
+    if not isinstance(parsed, dict):
+        return reply
+    if parsed.get("__whispr__"):
+        return parsed.get("text", reply)
+    if parsed.get("__image__") or parsed.get("__image_album__"):
+        return parsed.get("caption", "") or str(parsed.get("ocr_text", "") or "").strip()
+    return reply
+
+
+_CHOICE_SEPARATOR_RE = re.compile(r"[,\s]+")
+
+def _telegram_parse_choice(reply: str, choices: List[str], allow_multiple: bool):
+    """Map a reply to one choice (or a list when several are picked); None if invalid.
+
+    Accepts option numbers ("2", "1, 3") or the option text itself.
+    """
+    text = reply.strip()
+    lowered = {c.lower(): c for c in choices}
+    if text.lower() in lowered:
+        return lowered[text.lower()]
+    tokens = [t for t in _CHOICE_SEPARATOR_RE.split(text) if t]
+    if not tokens or not all(t.isdigit() and 1 <= int(t) <= len(choices) for t in tokens):
+        return None
+    picked = list(dict.fromkeys(choices[int(t) - 1] for t in tokens))
+    if len(picked) == 1:
+        return picked[0]
+    return picked if allow_multiple else None
+
+
+_TELEGRAM_CONFIRM_WORDS = frozenset({"yes", "y", "ok", "okay", "confirm", "approve", "sure", "👍"})
+
+def _telegram_send_info(notices: List[tuple]) -> Dict[str, Any]:
+    """Send one or more ``(title, message)`` notifications as a single message.
+
+    One-way: nothing is awaited in reply.
+    """
+    chat_id = _TG_CHAT_ID
+    if not chat_id:
+        raise RuntimeError("HITL_TELEGRAM_CHAT_ID is not set")
+    coord = _session_coordinator
+    tag = coord.format_tag() if coord and coord.session_id else ""
+    body = "\n\n".join(f"ℹ️ {title}\n\n{message}" for title, message in notices)
+    if tag:
+        body = f"{tag}\n{body}"
+    return _telegram_send_long_message(chat_id, body, timeout=20, parse_mode="HTML")
+
+# Fonts and theme colors depend only on the platform, so they are built once at
+# import instead of on every widget creation.
+if IS_MACOS:
+    SYSTEM_FONT = ("SF Pro Display", 13)  # macOS system font
+    TITLE_FONT = ("SF Pro Display", 16, "bold")
+    TEXT_FONT = ("Monaco", 12)  # macOS monospace font
+elif IS_WINDOWS:
+    SYSTEM_FONT = ("Segoe UI", 10)  # Windows system font
+    TITLE_FONT = ("Segoe UI", 14, "bold")
+    TEXT_FONT = ("Consolas", 11)  # Windows monospace font
+else:
+    SYSTEM_FONT = ("Ubuntu", 10)  # Linux/other systems
+    TITLE_FONT = ("Ubuntu", 14, "bold")
+    TEXT_FONT = ("Ubuntu Mono", 10)  # Linux monospace font
+
+# Smaller variant of the system font for hint/footnote labels
+HINT_FONT = (SYSTEM_FONT[0], SYSTEM_FONT[1] - 1)
+
+if IS_WINDOWS:
+    THEME_COLORS = {
+        "bg_primary": "#FFFFFF",           # Pure white background
+        "bg_secondary": "#F8F9FA",         # Light gray background
+        "bg_accent": "#F1F3F4",            # Accent background
+        "fg_primary": "#202124",           # Dark text
+        "fg_secondary": "#5F6368",         # Secondary text
+        "accent_color": "#0078D4",         # Windows blue
+        "accent_hover": "#106EBE",         # Darker blue for hover
+        "border_color": "#E8EAED",         # Light border
+        "success_color": "#137333",        # Green for success
+        "error_color": "#D93025",          # Red for errors
+        "selection_bg": "#E3F2FD",         # Light blue selection
+        "selection_fg": "#1565C0"          # Dark blue selection text
+    }
+elif IS_MACOS:
+    THEME_COLORS = {
+        "bg_primary": "#FFFFFF",
+        "bg_secondary": "#F5F5F7",
+        "bg_accent": "#F2F2F7",
+        "fg_primary": "#1D1D1F",
+        "fg_secondary": "#86868B",
+        "accent_color": "#007AFF",
+        "accent_hover": "#0056CC",
+        "border_color": "#D2D2D7",
+        "success_color": "#30D158",
+        "error_color": "#FF3B30",
+        "selection_bg": "#E3F2FD",
+        "selection_fg": "#1565C0"
+    }
+else:  # Linux
+    THEME_COLORS = {
+        "bg_primary": "#FFFFFF",
+        "bg_secondary": "#F8F9FA",
+        "bg_accent": "#F1F3F4",
+        "fg_primary": "#202124",
+        "fg_secondary": "#5F6368",
+        "accent_color": "#1976D2",
+        "accent_hover": "#1565C0",
+        "border_color": "#E8EAED",
+        "success_color": "#388E3C",
+        "error_color": "#D32F2F",
+        "selection_bg": "#E3F2FD",
+        "selection_fg": "#1565C0"
+    }
+
 def get_system_font():
     """Get appropriate system font for the current platform"""
-    if IS_MACOS:
-        return ("SF Pro Display", 13)  # macOS system font
-    elif IS_WINDOWS:
-        return ("Segoe UI", 10)  # Windows system font
-    else:
-        return ("Ubuntu", 10)  # Linux/other systems
+    return SYSTEM_FONT
 
 def get_title_font():
     """Get title font for dialogs"""
-    if IS_MACOS:
-        return ("SF Pro Display", 16, "bold")
-    elif IS_WINDOWS:
-        return ("Segoe UI", 14, "bold")
-    else:
-        return ("Ubuntu", 14, "bold")
+    return TITLE_FONT
 
 def get_text_font():
     """Get text font for text widgets"""
-    if IS_MACOS:
-        return ("Monaco", 12)  # macOS monospace font
-    elif IS_WINDOWS:
-        return ("Consolas", 11)  # Windows monospace font
-    else:
-        return ("Ubuntu Mono", 10)  # Linux monospace font
+    return TEXT_FONT
 
 def get_theme_colors():
     """Get modern theme colors based on platform"""
-    if IS_WINDOWS:
-        return {
-            "bg_primary": "#FFFFFF",           # Pure white background
-            "bg_secondary": "#F8F9FA",         # Light gray background
-            "bg_accent": "#F1F3F4",            # Accent background
-            "fg_primary": "#202124",           # Dark text
-            "fg_secondary": "#5F6368",         # Secondary text
-            "accent_color": "#0078D4",         # Windows blue
-            "accent_hover": "#106EBE",         # Darker blue for hover
-            "border_color": "#E8EAED",         # Light border
-            "success_color": "#137333",        # Green for success
-            "error_color": "#D93025",          # Red for errors
-            "selection_bg": "#E3F2FD",         # Light blue selection
-            "selection_fg": "#1565C0"          # Dark blue selection text
-        }
-    elif IS_MACOS:
-        return {
-            "bg_primary": "#FFFFFF",
-            "bg_secondary": "#F5F5F7",
-            "bg_accent": "#F2F2F7",
-            "fg_primary": "#1D1D1F",
-            "fg_secondary": "#86868B",
-            "accent_color": "#007AFF",
-            "accent_hover": "#0056CC",
-            "border_color": "#D2D2D7",
-            "success_color": "#30D158",
-            "error_color": "#FF3B30",
-            "selection_bg": "#E3F2FD",
-            "selection_fg": "#1565C0"
-        }
-    else:  # Linux
-        return {
-            "bg_primary": "#FFFFFF",
-            "bg_secondary": "#F8F9FA",
-            "bg_accent": "#F1F3F4",
-            "fg_primary": "#202124",
-            "fg_secondary": "#5F6368",
-            "accent_color": "#1976D2",
-            "accent_hover": "#1565C0",
-            "border_color": "#E8EAED",
-            "success_color": "#388E3C",
-            "error_color": "#D32F2F",
-            "selection_bg": "#E3F2FD",
-            "selection_fg": "#1565C0"
-        }
+    return THEME_COLORS
+
+def _build_widget_styles(theme_colors):
+    """Build the configure() options for each widget type from a theme."""
+    return {
+        "frame": {
+            "bg": theme_colors["bg_primary"],
+            "relief": "flat",
+            "borderwidth": 0,
+        },
+        "label": {
+            "bg": theme_colors["bg_primary"],
+            "fg": theme_colors["fg_primary"],
+            "font": SYSTEM_FONT,
+            "anchor": "w",
+        },
+        "title_label": {
+            "bg": theme_colors["bg_primary"],
+            "fg": theme_colors["fg_primary"],
+            "font": TITLE_FONT,
+            "anchor": "w",
+        },
+        "listbox": {
+            "bg": theme_colors["bg_primary"],
+            "fg": theme_colors["fg_primary"],
+            "selectbackground": theme_colors["selection_bg"],
+            "selectforeground": theme_colors["selection_fg"],
+            "relief": "solid",
+            "borderwidth": 1,
+            "highlightthickness": 1,
+            "highlightcolor": theme_colors["accent_color"],
+            "highlightbackground": theme_colors["border_color"],
+            "font": SYSTEM_FONT,
+            "activestyle": "none",
+        },
+        "text": {
+            "bg": theme_colors["bg_primary"],
+            "fg": theme_colors["fg_primary"],
+            "selectbackground": theme_colors["selection_bg"],
+            "selectforeground": theme_colors["selection_fg"],
+            "relief": "solid",
+            "borderwidth": 1,
+            "highlightthickness": 1,
+            "highlightcolor": theme_colors["accent_color"],
+            "highlightbackground": theme_colors["border_color"],
+            "font": TEXT_FONT,
+            "wrap": "word",
+            "padx": 12,
+            "pady": 8,
+        },
+        "scrollbar": {
+            "bg": theme_colors["bg_secondary"],
+            "troughcolor": theme_colors["bg_accent"],
+            "activebackground": theme_colors["accent_hover"],
+            "relief": "flat",
+            "borderwidth": 0,
+            "highlightthickness": 0,
+        },
+    }
+
+def _build_button_styles(theme_colors):
+    """(background, foreground, hover background) for each button type."""
+    return {
+        "primary": (theme_colors["accent_color"], "#FFFFFF", theme_colors["accent_hover"]),
+        "secondary": (theme_colors["bg_secondary"], theme_colors["fg_primary"], theme_colors["bg_accent"]),
+    }
 
-def apply_modern_style(widget, widget_type="default", theme_colors=None):
+# Styles for the platform theme, built once at import
+_WIDGET_STYLES = _build_widget_styles(THEME_COLORS)
+_BUTTON_STYLES = _build_button_styles(THEME_COLORS)
+
+def apply_modern_style(widget, widget_type="default", theme_colors=THEME_COLORS):
     """Apply modern styling to tkinter widgets"""
-    if theme_colors is None:
-        theme_colors = get_theme_colors()
+    if theme_colors is None or theme_colors is THEME_COLORS:
+        styles = _WIDGET_STYLES
+    else:
+        styles = _build_widget_styles(theme_colors)
     
+    options = styles.get(widget_type)
+    if not options:
+        return
     try:
-        if widget_type == "frame":
-            widget.configure(
-                bg=theme_colors["bg_primary"],
-                relief="flat",
-                borderwidth=0
-            )
-        elif widget_type == "label":
-            widget.configure(
-                bg=theme_colors["bg_primary"],
-                fg=theme_colors["fg_primary"],
-                font=get_system_font(),
-                anchor="w"
-            )
-        elif widget_type == "title_label":
-            widget.configure(
-                bg=theme_colors["bg_primary"],
-                fg=theme_colors["fg_primary"],
-                font=get_title_font(),
-                anchor="w"
-            )
-        elif widget_type == "listbox":
-            widget.configure(
-                bg=theme_colors["bg_primary"],
-                fg=theme_colors["fg_primary"],
-                selectbackground=theme_colors["selection_bg"],
-                selectforeground=theme_colors["selection_fg"],
-                relief="solid",
-                borderwidth=1,
-                highlightthickness=1,
-                highlightcolor=theme_colors["accent_color"],
-                highlightbackground=theme_colors["border_color"],
-                font=get_system_font(),
-                activestyle="none"
-            )
-        elif widget_type == "text":
-            widget.configure(
-                bg=theme_colors["bg_primary"],
-                fg=theme_colors["fg_primary"],
-                selectbackground=theme_colors["selection_bg"],
-                selectforeground=theme_colors["selection_fg"],
-                relief="solid",
-                borderwidth=1,
-                highlightthickness=1,
-                highlightcolor=theme_colors["accent_color"],
-                highlightbackground=theme_colors["border_color"],
-                font=get_text_font(),
-                wrap="word",
-                padx=12,
-                pady=8
-            )
-        elif widget_type == "scrollbar":
-            widget.configure(
-                bg=theme_colors["bg_secondary"],
-                troughcolor=theme_colors["bg_accent"],
-                activebackground=theme_colors["accent_hover"],
-                relief="flat",
-                borderwidth=0,
-                highlightthickness=0
-            )
+        widget.configure(**options)
     except Exception:
         pass  # Ignore styling errors on different platforms
 
-def create_modern_button(parent, text, command, button_type="primary", theme_colors=None):
+def create_modern_button(parent, text, command, button_type="primary", theme_colors=THEME_COLORS):
     """Create a modern styled button"""
-    if theme_colors is None:
-        theme_colors = get_theme_colors()
-    
-    if button_type == "primary":
-        bg_color = theme_colors["accent_color"]
-        fg_color = "#FFFFFF"
-        hover_color = theme_colors["accent_hover"]
-    else:  # secondary
-        bg_color = theme_colors["bg_secondary"]
-        fg_color = theme_colors["fg_primary"]
-        hover_color = theme_colors["bg_accent"]
+    if theme_colors is None or theme_colors is THEME_COLORS:
+        styles = _BUTTON_STYLES
+    else:
+        styles = _build_button_styles(theme_colors)
+    # Anything but "primary" gets the secondary look
+    bg_color, fg_color, hover_color = styles.get(button_type) or styles["secondary"]
     
     button = tk.Button(
         parent,
@@ -2267,7 +2978,7 @@ def create_modern_button(parent, text, command, button_type="primary", theme_col
         command=command,
         bg=bg_color,
         fg=fg_color,
-        font=get_system_font(),
+        font=SYSTEM_FONT,
         relief="flat",
         borderwidth=0,
         padx=20,
@@ -2289,7 +3000,7 @@ def create_modern_button(parent, text, command, button_type="primary", theme_col
 
 def configure_modern_window(window):
     """Apply modern window styling"""
-    theme_colors = get_theme_colors()
+    theme_colors = THEME_COLORS
     
     try:
         window.configure(bg=theme_colors["bg_primary"])
@@ -2309,9 +3020,17 @@ def configure_modern_window(window):
     except Exception:
         pass  # Fallback to basic styling
 
+_macos_app_configured = False
+
 def configure_macos_app():
-    """Configure macOS-specific application settings"""
-    if IS_MACOS:
+    """Configure macOS-specific application settings
+
+    Spawning osascript costs a fork+exec per call, so it only runs once per
+    process; later dialogs rely on lift()/focus_force() alone.
+    """
+    global _macos_app_configured
+    if IS_MACOS and not _macos_app_configured:
+        _macos_app_configured = True
         try:
             # Try to bring Python to front on macOS
             subprocess.run([
@@ -2321,37 +3040,73 @@ def configure_macos_app():
         except Exception:
             pass  # Ignore if osascript is not available
 
+def _load_tkinter():
+    """Import tkinter into the module globals the first time a dialog needs it."""
+    global tk
+    if tk is None:
+        import tkinter
+        tk = tkinter
+
+def _get_gui_root():
+    """Return the shared hidden Tk root, creating it on first use.
+
+    Must be called on the GUI worker thread (see ``_gui_executor``).
+    """
+    global _gui_root, _gui_screen_size
+    _load_tkinter()
+    if _gui_root is not None:
+        try:
+            if _gui_root.winfo_exists():
+                return _gui_root
+        except tk.TclError:
+            pass
+    _gui_root = tk.Tk()
+    _gui_root.withdraw()
+    _gui_screen_size = None
+
+    # Platform-specific initialization
+    if IS_MACOS:
+        # macOS-specific configuration
+        _gui_root.call('wm', 'attributes', '.', '-topmost', '1')
+        configure_macos_app()
+    elif IS_WINDOWS:
+        # Windows-specific configuration (existing behavior)
+        _gui_root.attributes('-topmost', True)
+    return _gui_root
+
+def _get_screen_size(window):
+    """Return the screen (width, height), querying Tk only on first use."""
+    global _gui_screen_size
+    if _gui_screen_size is None:
+        _gui_screen_size = (window.winfo_screenwidth(), window.winfo_screenheight())
+    return _gui_screen_size
+
 def ensure_gui_initialized():
     """Ensure GUI subsystem is properly initialized"""
     global _gui_initialized
+    if _gui_initialized:
+        # Already up — skip the lock and the GUI-thread round-trip
+        return True
     with _gui_lock:
         if not _gui_initialized:
-            test_root = None
             try:
-                test_root = tk.Tk()
-                test_root.withdraw()
-                
-                # Platform-specific initialization
-                if IS_MACOS:
-                    # macOS-specific configuration
-                    test_root.call('wm', 'attributes', '.', '-topmost', '1')
-                    configure_macos_app()
-                elif IS_WINDOWS:
-                    # Windows-specific configuration (existing behavior)
-                    test_root.attributes('-topmost', True)
-                
+                _gui_executor.submit(_get_gui_root).result()
                 _gui_initialized = True
             except Exception as e:
                 logging.getLogger("hitl-mcp").warning("GUI initialization failed: %s", e)
                 _gui_initialized = False
-            finally:
-                if test_root:
-                    try:
-                        test_root.destroy()
-                    except Exception:
-                        pass
         return _gui_initialized
 
+async def ensure_gui_initialized_async() -> bool:
+    """Awaitable ensure_gui_initialized for tool handlers.
+
+    First-time Tk startup waits on the GUI thread; doing that from a worker
+    keeps the event loop serving other MCP requests meanwhile.
+    """
+    if _gui_initialized:
+        return True
+    return await asyncio.to_thread(ensure_gui_initialized)
+
 def configure_window_for_platform(window):
     """Apply platform-specific window configurations"""
     try:
@@ -2373,11 +3128,9 @@ def configure_window_for_platform(window):
 def create_input_dialog(title: str, prompt: str, default_value: str = "", input_type: str = "text"):
     """Create a modern input dialog window"""
     try:
-        root = tk.Tk()
-        root.withdraw()
+        root = _get_gui_root()
         dialog = ModernInputDialog(root, title, prompt, default_value, input_type)
         result = dialog.result
-        root.destroy()
         return result
     except Exception as e:
         print(f"Error in input dialog: {e}")
@@ -2386,11 +3139,9 @@ def create_input_dialog(title: str, prompt: str, default_value: str = "", input_
 def show_confirmation(title: str, message: str):
     """Show modern confirmation dialog"""
     try:
-        root = tk.Tk()
-        root.withdraw()
+        root = _get_gui_root()
         dialog = ModernConfirmationDialog(root, title, message)
         result = dialog.result
-        root.destroy()
         return result
     except Exception as e:
         print(f"Error in confirmation dialog: {e}")
@@ -2399,40 +3150,59 @@ def show_confirmation(title: str, message: str):
 def show_info(title: str, message: str):
     """Show modern info dialog"""
     try:
-        root = tk.Tk()
-        root.withdraw()
+        root = _get_gui_root()
         dialog = ModernInfoDialog(root, title, message)
         result = dialog.result
-        root.destroy()
         return result
     except Exception as e:
         print(f"Error in info dialog: {e}")
         return False
 
-class ModernInputDialog:
-    def __init__(self, parent, title, prompt, default_value="", input_type="text"):
-        self.result = None
-        self.input_type = input_type
-        
-        # Get theme colors
-        self.theme_colors = get_theme_colors()
+# Dialogs sit slightly above center on macOS/Windows (menu bar / taskbar)
+_Y_OFFSET = 50 if IS_MACOS else (30 if IS_WINDOWS else 0)
+
+class _CenteredDialog:
+    """Mixin that centers ``self.dialog`` using the ``self._size`` "WxH" string."""
+
+    def center_window(self):
+        """Center the dialog window on screen"""
+        # Parse the size we just requested rather than forcing a layout pass
+        width, height = map(int, self._size.split("x"))
+        screen_width, screen_height = _get_screen_size(self.dialog)
+        x = (screen_width // 2) - (width // 2)
+        y = (screen_height // 2) - (height // 2)
+        if _Y_OFFSET:
+            y = max(_Y_OFFSET, y - _Y_OFFSET)
+        self.dialog.geometry(f"{width}x{height}+{x}+{y}")
+
+class _ModernDialog(_CenteredDialog):
+    """Window, header and button row shared by the small modern dialogs.
+
+    Subclasses pick the geometry and spacing through class attributes, add any
+    extra widgets in ``_build_body`` and may replace the default single OK
+    button in ``_build_buttons``. Return triggers ``_accept``; Escape and closing the
+    window trigger ``_dismiss``.
+    """
+
+    GEOMETRY_WINDOWS = "420x200"
+    GEOMETRY_OTHER = "400x180"
+    TITLE_PADY = (0, 12)
+    MESSAGE_PADY = (0, 24)
+    MESSAGE_WRAPLENGTH = 350
+
+    def __init__(self, parent, title, message):
+        # Platform theme (module constant)
+        self.theme_colors = THEME_COLORS
         
         # Create the dialog window
         self.dialog = tk.Toplevel(parent)
+        # Build the widget tree while withdrawn so Tk lays it out once
+        self.dialog.withdraw()
         self.dialog.title(title)
-        self.dialog.grab_set()
         self.dialog.resizable(False, False)
         
-        # Apply modern window styling
-        configure_modern_window(self.dialog)
-        
         # Set size based on platform
-        if IS_WINDOWS:
-            self.dialog.geometry("420x280")
-        else:
-            self.dialog.geometry("400x260")
-        
-        self.center_window()
+        self._size = self.GEOMETRY_WINDOWS if IS_WINDOWS else self.GEOMETRY_OTHER
         
         # Create the main frame
         main_frame = tk.Frame(self.dialog, bg=self.theme_colors["bg_primary"])
@@ -2444,31 +3214,81 @@ class ModernInputDialog:
             text=title,
             bg=self.theme_colors["bg_primary"],
             fg=self.theme_colors["fg_primary"],
-            font=get_title_font(),
+            font=TITLE_FONT,
             anchor="w"
         )
-        title_label.pack(fill="x", pady=(0, 8))
+        title_label.pack(fill="x", pady=self.TITLE_PADY)
         
-        # Prompt label
-        prompt_label = tk.Label(
+        # Message / prompt label
+        message_label = tk.Label(
             main_frame,
-            text=prompt,
+            text=message,
             bg=self.theme_colors["bg_primary"],
             fg=self.theme_colors["fg_secondary"],
-            font=get_system_font(),
-            wraplength=350,
+            font=SYSTEM_FONT,
+            wraplength=self.MESSAGE_WRAPLENGTH,
             justify="left",
             anchor="w"
         )
-        prompt_label.pack(fill="x", pady=(0, 20))
+        message_label.pack(fill="x", pady=self.MESSAGE_PADY)
+        
+        self._build_body(main_frame)
         
+        # Button frame
+        button_frame = tk.Frame(main_frame, bg=self.theme_colors["bg_primary"])
+        button_frame.pack(fill="x")
+        focus_widget = self._build_buttons(button_frame)
+        
+        # Handle window close and keyboard shortcuts
+        self.dialog.protocol("WM_DELETE_WINDOW", self._dismiss)
+        self.dialog.bind('<Return>', lambda e: self._accept())
+        self.dialog.bind('<Escape>', lambda e: self._dismiss())
+        
+        # Position, then map and style the finished window in one go
+        self.center_window()
+        self.dialog.deiconify()
+        configure_modern_window(self.dialog)
+        self.dialog.grab_set()
+        
+        focus_widget.focus_set()
+        
+        # Wait for dialog completion
+        self.dialog.wait_window()
+    
+    def _build_body(self, main_frame):
+        """Add widgets between the message and the buttons (none by default)."""
+    
+    def _build_buttons(self, button_frame):
+        """Create the buttons and return the widget that should take focus.
+
+        The default is a single OK button that triggers ``_accept``.
+        """
+        self.ok_button = create_modern_button(
+            button_frame, "OK", self._accept, "primary", self.theme_colors
+        )
+        self.ok_button.pack(side=tk.RIGHT)
+        return self.ok_button
+    
+class ModernInputDialog(_ModernDialog):
+    GEOMETRY_WINDOWS = "420x280"
+    GEOMETRY_OTHER = "400x260"
+    TITLE_PADY = (0, 8)
+    MESSAGE_PADY = (0, 20)
+
+    def __init__(self, parent, title, prompt, default_value="", input_type="text"):
+        self.result = None
+        self.input_type = input_type
+        self.default_value = default_value
+        super().__init__(parent, title, prompt)
+    
+    def _build_body(self, main_frame):
         # Input field
         input_frame = tk.Frame(main_frame, bg=self.theme_colors["bg_primary"])
         input_frame.pack(fill="x", pady=(0, 24))
         
         self.entry = tk.Entry(
             input_frame,
-            font=get_system_font(),
+            font=SYSTEM_FONT,
             bg=self.theme_colors["bg_primary"],
             fg=self.theme_colors["fg_primary"],
             relief="solid",
@@ -2480,14 +3300,11 @@ class ModernInputDialog:
         )
         self.entry.pack(fill="x", ipady=8, ipadx=12)
         
-        if default_value:
-            self.entry.insert(0, default_value)
+        if self.default_value:
+            self.entry.insert(0, self.default_value)
             self.entry.select_range(0, tk.END)
-        
-        # Button frame
-        button_frame = tk.Frame(main_frame, bg=self.theme_colors["bg_primary"])
-        button_frame.pack(fill="x")
-        
+    
+    def _build_buttons(self, button_frame):
         # Create modern buttons
         self.ok_button = create_modern_button(
             button_frame, "OK", self.ok_clicked, "primary", self.theme_colors
@@ -2499,110 +3316,30 @@ class ModernInputDialog:
         )
         self.cancel_button.pack(side=tk.RIGHT)
         
-        # Handle window close and keyboard shortcuts
-        self.dialog.protocol("WM_DELETE_WINDOW", self.cancel_clicked)
-        self.dialog.bind('<Return>', lambda e: self.ok_clicked())
-        self.dialog.bind('<Escape>', lambda e: self.cancel_clicked())
-        
         # Focus on entry
-        self.entry.focus_set()
-        
-        # Wait for dialog completion
-        self.dialog.wait_window()
-    
-    def center_window(self):
-        """Center the dialog window on screen"""
-        self.dialog.update_idletasks()
-        width = self.dialog.winfo_width()
-        height = self.dialog.winfo_height()
-        screen_width = self.dialog.winfo_screenwidth()
-        screen_height = self.dialog.winfo_screenheight()
-        x = (screen_width // 2) - (width // 2)
-        y = (screen_height // 2) - (height // 2)
-        
-        if IS_MACOS:
-            y = max(50, y - 50)
-        elif IS_WINDOWS:
-            y = max(30, y - 30)
-            
-        self.dialog.geometry(f"{width}x{height}+{x}+{y}")
+        return self.entry
     
     def ok_clicked(self):
-        value = self.entry.get()
-        if self.input_type == "integer":
-            try:
-                self.result = int(value) if value else None
-            except ValueError:
-                self.result = None
-        elif self.input_type == "float":
-            try:
-                self.result = float(value) if value else None
-            except ValueError:
-                self.result = None
-        else:
-            self.result = value if value else None
+        self.result = _coerce_typed_input(self.entry.get(), self.input_type)
         self.dialog.destroy()
     
     def cancel_clicked(self):
         self.result = None
         self.dialog.destroy()
 
-class ModernConfirmationDialog:
+    _accept = ok_clicked
+    _dismiss = cancel_clicked
+
+class ModernConfirmationDialog(_ModernDialog):
+    GEOMETRY_WINDOWS = "440x220"
+    GEOMETRY_OTHER = "420x200"
+    MESSAGE_WRAPLENGTH = 370
+
     def __init__(self, parent, title, message):
         self.result = False
-        
-        # Get theme colors
-        self.theme_colors = get_theme_colors()
-        
-        # Create the dialog window
-        self.dialog = tk.Toplevel(parent)
-        self.dialog.title(title)
-        self.dialog.grab_set()
-        self.dialog.resizable(False, False)
-        
-        # Apply modern window styling
-        configure_modern_window(self.dialog)
-        
-        # Set size based on content
-        if IS_WINDOWS:
-            self.dialog.geometry("440x220")
-        else:
-            self.dialog.geometry("420x200")
-        
-        self.center_window()
-        
-        # Create the main frame
-        main_frame = tk.Frame(self.dialog, bg=self.theme_colors["bg_primary"])
-        main_frame.pack(fill="both", expand=True, padx=24, pady=20)
-        
-        # Title label
-        title_label = tk.Label(
-            main_frame,
-            text=title,
-            bg=self.theme_colors["bg_primary"],
-            fg=self.theme_colors["fg_primary"],
-            font=get_title_font(),
-            anchor="w"
-        )
-        title_label.pack(fill="x", pady=(0, 12))
-        
-        # Message label
-        message_label = tk.Label(
-            main_frame,
-            text=message,
-            bg=self.theme_colors["bg_primary"],
-            fg=self.theme_colors["fg_secondary"],
-            font=get_system_font(),
-            wraplength=370,
-            justify="left",
-            anchor="w"
-        )
-        message_label.pack(fill="x", pady=(0, 24))
-        
-        # Button frame
-        button_frame = tk.Frame(main_frame, bg=self.theme_colors["bg_primary"])
-        button_frame.pack(fill="x")
-        
+        super().__init__(parent, title, message)
+    
+    def _build_buttons(self, button_frame):
         # Create modern buttons
         self.yes_button = create_modern_button(
             button_frame, "Yes", self.yes_clicked, "primary", self.theme_colors
@@ -2614,33 +3351,8 @@ class ModernConfirmationDialog:
         )
         self.no_button.pack(side=tk.RIGHT)
         
-        # Handle window close and keyboard shortcuts
-        self.dialog.protocol("WM_DELETE_WINDOW", self.no_clicked)
-        self.dialog.bind('<Return>', lambda e: self.yes_clicked())
-        self.dialog.bind('<Escape>', lambda e: self.no_clicked())
-        
         # Focus on No button by default (safer)
-        self.no_button.focus_set()
-        
-        # Wait for dialog completion
-        self.dialog.wait_window()
-    
-    def center_window(self):
-        """Center the dialog window on screen"""
-        self.dialog.update_idletasks()
-        width = self.dialog.winfo_width()
-        height = self.dialog.winfo_height()
-        screen_width = self.dialog.winfo_screenwidth()
-        screen_height = self.dialog.winfo_screenheight()
-        x = (screen_width // 2) - (width // 2)
-        y = (screen_height // 2) - (height // 2)
-        
-        if IS_MACOS:
-            y = max(50, y - 50)
-        elif IS_WINDOWS:
-            y = max(30, y - 30)
-            
-        self.dialog.geometry(f"{width}x{height}+{x}+{y}")
+        return self.no_button
     
     def yes_clicked(self):
         self.result = True
@@ -2650,108 +3362,29 @@ class ModernConfirmationDialog:
         self.result = False
         self.dialog.destroy()
 
-class ModernInfoDialog:
-    def __init__(self, parent, title, message):
-        self.result = True
-        
-        # Get theme colors
-        self.theme_colors = get_theme_colors()
-        
-        # Create the dialog window
-        self.dialog = tk.Toplevel(parent)
-        self.dialog.title(title)
-        self.dialog.grab_set()
-        self.dialog.resizable(False, False)
-        
-        # Apply modern window styling
-        configure_modern_window(self.dialog)
-        
-        # Set size based on content
-        if IS_WINDOWS:
-            self.dialog.geometry("420x200")
-        else:
-            self.dialog.geometry("400x180")
-        
-        self.center_window()
-        
-        # Create the main frame
-        main_frame = tk.Frame(self.dialog, bg=self.theme_colors["bg_primary"])
-        main_frame.pack(fill="both", expand=True, padx=24, pady=20)
-        
-        # Title label
-        title_label = tk.Label(
-            main_frame,
-            text=title,
-            bg=self.theme_colors["bg_primary"],
-            fg=self.theme_colors["fg_primary"],
-            font=get_title_font(),
-            anchor="w"
-        )
-        title_label.pack(fill="x", pady=(0, 12))
-        
-        # Message label
-        message_label = tk.Label(
-            main_frame,
-            text=message,
-            bg=self.theme_colors["bg_primary"],
-            fg=self.theme_colors["fg_secondary"],
-            font=get_system_font(),
-            wraplength=350,
-            justify="left",
-            anchor="w"
-        )
-        message_label.pack(fill="x", pady=(0, 24))
-        
-        # Button frame
-        button_frame = tk.Frame(main_frame, bg=self.theme_colors["bg_primary"])
-        button_frame.pack(fill="x")
-        
-        # Create modern OK button
-        self.ok_button = create_modern_button(
-            button_frame, "OK", self.ok_clicked, "primary", self.theme_colors
-        )
-        self.ok_button.pack(side=tk.RIGHT)
-        
-        # Handle window close and keyboard shortcuts
-        self.dialog.protocol("WM_DELETE_WINDOW", self.ok_clicked)
-        self.dialog.bind('<Return>', lambda e: self.ok_clicked())
-        self.dialog.bind('<Escape>', lambda e: self.ok_clicked())
-        
-        # Focus on OK button
-        self.ok_button.focus_set()
-        
-        # Wait for dialog completion
-        self.dialog.wait_window()
-    
-    def center_window(self):
-        """Center the dialog window on screen"""
-        self.dialog.update_idletasks()
-        width = self.dialog.winfo_width()
-        height = self.dialog.winfo_height()
-        screen_width = self.dialog.winfo_screenwidth()
-        screen_height = self.dialog.winfo_screenheight()
-        x = (screen_width // 2) - (width // 2)
-        y = (screen_height // 2) - (height // 2)
-        
-        if IS_MACOS:
-            y = max(50, y - 50)
-        elif IS_WINDOWS:
-            y = max(30, y - 30)
-            
-        self.dialog.geometry(f"{width}x{height}+{x}+{y}")
+    _accept = yes_clicked
+    _dismiss = no_clicked
+
+class ModernInfoDialog(_ModernDialog):
+    def __init__(self, parent, title, message):
+        self.result = True
+        super().__init__(parent, title, message)
+    
+    # Uses the default single OK button from _ModernDialog
     
     def ok_clicked(self):
         self.result = True
         self.dialog.destroy()
 
+    _accept = ok_clicked
+    _dismiss = ok_clicked
+
 def create_choice_dialog(title: str, prompt: str, choices: List[str], allow_multiple: bool = False):
     """Create a choice dialog window"""
     try:
-        root = tk.Tk()
-        root.withdraw()
+        root = _get_gui_root()
         dialog = ChoiceDialog(root, title, prompt, choices, allow_multiple)
         result = dialog.result
-        root.destroy()
         return result
     except Exception as e:
         print(f"Error in choice dialog: {e}")
@@ -2760,70 +3393,39 @@ def create_choice_dialog(title: str, prompt: str, choices: List[str], allow_mult
 def create_multiline_input_dialog(title: str, prompt: str, default_value: str = ""):
     """Create a multi-line text input dialog"""
     try:
-        root = tk.Tk()
-        root.withdraw()
+        root = _get_gui_root()
         dialog = MultilineInputDialog(root, title, prompt, default_value)
         result = dialog.result
-        root.destroy()
         return result
     except Exception as e:
         print(f"Error in multiline dialog: {e}")
         return None
 
-def show_confirmation(title: str, message: str):
-    """Show confirmation dialog"""
-    try:
-        root = tk.Tk()
-        root.withdraw()
-        configure_window_for_platform(root)
-        result = messagebox.askyesno(title, message, parent=root)
-        root.destroy()
-        return result
-    except Exception as e:
-        print(f"Error in confirmation dialog: {e}")
-        return False
-
-def show_info(title: str, message: str):
-    """Show info dialog"""
-    try:
-        root = tk.Tk()
-        root.withdraw()
-        configure_window_for_platform(root)
-        messagebox.showinfo(title, message, parent=root)
-        root.destroy()
-        return True
-    except Exception as e:
-        print(f"Error in info dialog: {e}")
-        return False
-
-class ChoiceDialog:
+class ChoiceDialog(_CenteredDialog):
     def __init__(self, parent, title, prompt, choices, allow_multiple=False):
         self.result = None
         
-        # Get theme colors
-        self.theme_colors = get_theme_colors()
+        # Get theme colors (bound once; reused by every widget below)
+        self.theme_colors = THEME_COLORS
+        bg = self.theme_colors["bg_primary"]
         
         # Create the dialog window
         self.dialog = tk.Toplevel(parent)
+        # Build the widget tree while withdrawn so Tk lays it out once
+        self.dialog.withdraw()
         self.dialog.title(title)
-        self.dialog.grab_set()
         self.dialog.resizable(True, True)
         
-        # Apply modern window styling
-        configure_modern_window(self.dialog)
-        
         # Set size based on platform
         if IS_MACOS:
-            self.dialog.geometry("480x400")
+            self._size = "480x400"
         elif IS_WINDOWS:
-            self.dialog.geometry("500x420")
+            self._size = "500x420"
         else:
-            self.dialog.geometry("450x350")
-        
-        self.center_window()
+            self._size = "450x350"
         
         # Create the main frame with modern styling
-        main_frame = tk.Frame(self.dialog, bg=self.theme_colors["bg_primary"])
+        main_frame = tk.Frame(self.dialog, bg=bg)
         main_frame.pack(fill="both", expand=True, padx=24, pady=20)
         
         # Configure grid weights
@@ -2834,9 +3436,9 @@ class ChoiceDialog:
         title_label = tk.Label(
             main_frame, 
             text=title,
-            bg=self.theme_colors["bg_primary"],
+            bg=bg,
             fg=self.theme_colors["fg_primary"],
-            font=get_title_font(),
+            font=TITLE_FONT,
             anchor="w"
         )
         title_label.grid(row=0, column=0, sticky="ew", pady=(0, 8))
@@ -2845,9 +3447,9 @@ class ChoiceDialog:
         prompt_label = tk.Label(
             main_frame,
             text=prompt,
-            bg=self.theme_colors["bg_primary"],
+            bg=bg,
             fg=self.theme_colors["fg_secondary"],
-            font=get_system_font(),
+            font=SYSTEM_FONT,
             wraplength=450,
             justify="left",
             anchor="w"
@@ -2855,7 +3457,7 @@ class ChoiceDialog:
         prompt_label.grid(row=1, column=0, sticky="ew", pady=(0, 20))
         
         # Create choice selection widget with modern container
-        list_container = tk.Frame(main_frame, bg=self.theme_colors["bg_primary"])
+        list_container = tk.Frame(main_frame, bg=bg)
         list_container.grid(row=2, column=0, sticky="nsew", pady=(0, 24))
         list_container.columnconfigure(0, weight=1)
         list_container.rowconfigure(0, weight=1)
@@ -2868,8 +3470,6 @@ class ChoiceDialog:
         
         apply_modern_style(self.listbox, "listbox", self.theme_colors)
         
-        for choice in choices:
-            self.listbox.insert(tk.END, choice)
         self.listbox.grid(row=0, column=0, sticky="nsew", padx=(0, 2))
         
         # Modern scrollbar
@@ -2879,7 +3479,7 @@ class ChoiceDialog:
         self.listbox.configure(yscrollcommand=scrollbar.set)
         
         # Modern button frame
-        button_frame = tk.Frame(main_frame, bg=self.theme_colors["bg_primary"])
+        button_frame = tk.Frame(main_frame, bg=bg)
         button_frame.grid(row=3, column=0, sticky="ew")
         
         # Create modern buttons
@@ -2896,10 +3496,20 @@ class ChoiceDialog:
         # Handle window close
         self.dialog.protocol("WM_DELETE_WINDOW", self.cancel_clicked)
         
+        # Items go in once the window is mapped, so the empty frame shows
+        # without first laying out a long choice list.
+        self._choices = choices
+        self._populated = False
+        self.dialog.bind("<Map>", self._populate, add=True)
+        
+        # Position, then map and style the finished window in one go
+        self.center_window()
+        self.dialog.deiconify()
+        configure_modern_window(self.dialog)
+        self.dialog.grab_set()
+        
         # Focus on listbox
         self.listbox.focus_set()
-        if choices:
-            self.listbox.selection_set(0)  # Select first item by default
         
         # Platform-specific final setup
         if IS_MACOS:
@@ -2912,28 +3522,18 @@ class ChoiceDialog:
         # Wait for the dialog to complete
         self.dialog.wait_window()
     
-    def center_window(self):
-        """Center the dialog window on screen"""
-        self.dialog.update_idletasks()
-        width = self.dialog.winfo_width()
-        height = self.dialog.winfo_height()
-        
-        # Get screen dimensions
-        screen_width = self.dialog.winfo_screenwidth()
-        screen_height = self.dialog.winfo_screenheight()
-        
-        # Calculate center position
-        x = (screen_width // 2) - (width // 2)
-        y = (screen_height // 2) - (height // 2)
-        
-        # Platform-specific adjustments
-        if IS_MACOS:
-            y = max(50, y - 50)
-        elif IS_WINDOWS:
-            y = max(30, y - 30)
-        
-        self.dialog.geometry(f"{width}x{height}+{x}+{y}")
-    
+    def _populate(self, event=None):
+        """Fill the listbox on first map."""
+        # The binding stays: unbind() would drop every <Map> script on the
+        # Toplevel, and its children's Map events reach it through bindtags.
+        if self._populated:
+            return
+        self._populated = True
+        if self._choices:
+            # One Tcl call for all items instead of one insert per choice
+            self.listbox.insert(tk.END, *self._choices)
+            self.listbox.selection_set(0)  # Select first item by default
+
     def ok_clicked(self):
         selection = self.listbox.curselection()
         if selection:
@@ -2945,37 +3545,39 @@ class ChoiceDialog:
         self.result = None
         self.dialog.destroy()
 
-class MultilineInputDialog:
+class MultilineInputDialog(_CenteredDialog):
     def __init__(self, parent, title, prompt, default_value=""):
         self.result = None
         self._user_input_mark = "user_input_start"  # Tkinter mark name
 
-        # Get theme colors
-        self.theme_colors = get_theme_colors()
+        # Get theme colors and fonts once; reused by every widget and tag below
+        self.theme_colors = THEME_COLORS
+        bg = self.theme_colors["bg_primary"]
+        fg = self.theme_colors["fg_primary"]
+        accent = self.theme_colors["accent_color"]
+        system_font = SYSTEM_FONT
+        text_font = TEXT_FONT
 
         # Create the dialog window
         self.dialog = tk.Toplevel(parent)
+        # Build the widget tree while withdrawn so Tk lays it out once
+        self.dialog.withdraw()
         self.dialog.title(title)
         # NOTE: grab_set() is intentionally omitted — on Windows it fights with
         # VS Code for the window grab and causes the dialog to self-cancel when
         # VS Code briefly reclaims focus. wait_window() below is sufficient.
         self.dialog.resizable(True, True)
 
-        # Apply modern window styling
-        configure_modern_window(self.dialog)
-
         # Set size based on platform (taller to accommodate AI output + input)
         if IS_MACOS:
-            self.dialog.geometry("620x640")
+            self._size = "620x640"
         elif IS_WINDOWS:
-            self.dialog.geometry("650x660")
+            self._size = "650x660"
         else:
-            self.dialog.geometry("580x600")
-
-        self.center_window()
+            self._size = "580x600"
 
         # Create the main frame with modern styling
-        main_frame = tk.Frame(self.dialog, bg=self.theme_colors["bg_primary"])
+        main_frame = tk.Frame(self.dialog, bg=bg)
         main_frame.pack(fill="both", expand=True, padx=24, pady=20)
 
         # Configure grid weights — row 1 holds the text widget and expands
@@ -2986,16 +3588,16 @@ class MultilineInputDialog:
         title_label = tk.Label(
             main_frame,
             text=title,
-            bg=self.theme_colors["bg_primary"],
-            fg=self.theme_colors["fg_primary"],
-            font=get_title_font(),
+            bg=bg,
+            fg=fg,
+            font=TITLE_FONT,
             anchor="w"
         )
         title_label.grid(row=0, column=0, sticky="ew", pady=(0, 8))
 
         # Create text widget container (row 1) — no separate prompt label,
         # the AI output is shown directly inside the text widget.
-        text_container = tk.Frame(main_frame, bg=self.theme_colors["bg_primary"])
+        text_container = tk.Frame(main_frame, bg=bg)
         text_container.grid(row=1, column=0, sticky="nsew", pady=(0, 16))
         text_container.columnconfigure(0, weight=1)
         text_container.rowconfigure(0, weight=1)
@@ -3007,9 +3609,9 @@ class MultilineInputDialog:
         # the widget does NOT have keyboard focus (inactiveselectbackground).
         # Without this Windows shows a near-invisible grey for inactive selection.
         self.text_widget.configure(
-            selectbackground=self.theme_colors["accent_color"],
+            selectbackground=accent,
             selectforeground="#FFFFFF",
-            inactiveselectbackground=self.theme_colors["accent_color"],
+            inactiveselectbackground=accent,
         )
         self.text_widget.grid(row=0, column=0, sticky="nsew", padx=(0, 2))
 
@@ -3022,25 +3624,25 @@ class MultilineInputDialog:
         # ── Tag for the AI output region (visually distinct, read-only feel) ──
         self.text_widget.tag_configure(
             "ai_output",
-            foreground=self.theme_colors["fg_primary"],
+            foreground=fg,
             background=self.theme_colors["bg_accent"],
-            font=get_text_font(),
+            font=text_font,
             lmargin1=8,
             lmargin2=8,
         )
         # ── Tag for the delineator line ──
         self.text_widget.tag_configure(
             "separator",
-            foreground=self.theme_colors["accent_color"],
-            font=get_system_font(),
+            foreground=accent,
+            font=system_font,
             justify="center",
         )
         # ── Tag for the user input region ──
         self.text_widget.tag_configure(
             "user_input",
-            foreground=self.theme_colors["fg_primary"],
-            background=self.theme_colors["bg_primary"],
-            font=get_text_font(),
+            foreground=fg,
+            background=bg,
+            font=text_font,
             lmargin1=8,
             lmargin2=8,
         )
@@ -3048,47 +3650,31 @@ class MultilineInputDialog:
         # Configure the built-in 'sel' tag explicitly so it is never washed out.
         self.text_widget.tag_configure(
             "sel",
-            background=self.theme_colors["accent_color"],
+            background=accent,
             foreground="#FFFFFF",
         )
-        # tag_raise must come AFTER all tag_configure calls.
+        # ── Make the built-in 'sel' tag render ON TOP of our custom tags ──
+        # Without this our ai_output / user_input tag backgrounds swallow the
+        # blue selection highlight and make it invisible. Tag priority is
+        # independent of content, so once — after all tag_configure calls — is enough.
         self.text_widget.tag_raise("sel")
 
-        # Insert AI output (prompt) into the textbox
-        if prompt:
-            self.text_widget.insert("1.0", prompt)
-            ai_end = self.text_widget.index(tk.END)
-            self.text_widget.tag_add("ai_output", "1.0", ai_end)
-
-        # Insert delineator on its own line
-        sep_text = "\n" + MULTILINE_DELINEATOR + "\n"
-        sep_start = self.text_widget.index(tk.END)
-        self.text_widget.insert(tk.END, sep_text)
-        sep_end = self.text_widget.index(tk.END)
-        self.text_widget.tag_add("separator", sep_start, sep_end)
-
-        # Place the 'user_input_start' mark right after the delineator.
         # LEFT gravity: when the user types AT the mark position the mark stays
         # put and text is inserted to its right, so get(mark, END) always
         # captures exactly what the user typed and nothing more.
         self.text_widget.mark_set(self._user_input_mark, tk.END)
         self.text_widget.mark_gravity(self._user_input_mark, "left")
 
-        # Insert any pre-fill for the user area (e.g., default_value)
-        if default_value:
-            self.text_widget.insert(tk.END, default_value)
-            user_end = self.text_widget.index(tk.END)
-            self.text_widget.tag_add("user_input", self._user_input_mark, user_end)
-
-        # Move cursor to end of user input area and scroll there
-        self.text_widget.mark_set(tk.INSERT, tk.END)
-        self.text_widget.see(tk.END)
-
-        # ── Make the built-in 'sel' tag render ON TOP of our custom tags ──
-        # Without this our ai_output / user_input tag backgrounds swallow the
-        # blue selection highlight and make it invisible.
-        self.text_widget.tag_raise("sel")
+        # The prompt text is inserted once the window is mapped (see _populate),
+        # so the frame shows without first measuring a long prompt.
+        self._prompt = prompt
+        self._default_value = default_value
+        self._populated = False
+        self.dialog.bind("<Map>", self._populate, add=True)
 
+        # The key handlers below run on every keystroke. Text.compare accepts
+        # mark names directly, so each check is a single Tcl call and always
+        # sees the mark's live position (it can shift if text is pasted above it).
         def _guard_printable(event):
             """
             For printable keys only: if cursor is in the protected zone, silently
@@ -3096,47 +3682,27 @@ class MultilineInputDialog:
             Navigation, Ctrl/Alt combos, BackSpace, Delete are never intercepted
             so tkinter's native Text handling works fully unimpeded.
             """
-            if event.state & (0x4 | 0x8):   # Ctrl or Alt — always pass through
+            if event.state & _MOD_MASK_CTRL_ALT:   # Ctrl or Alt — always pass through
                 return
-            if not event.char or event.keysym in (
-                'BackSpace', 'Delete',
-                'Up', 'Down', 'Left', 'Right',
-                'Home', 'End', 'Prior', 'Next',
-                'Shift_L', 'Shift_R', 'Control_L', 'Control_R',
-                'Alt_L', 'Alt_R', 'Tab', 'ISO_Left_Tab',
-                'Escape', 'Return',
-                'F1','F2','F3','F4','F5','F6','F7','F8','F9','F10','F11','F12',
-            ):
+            if not event.char or event.keysym in _NON_PRINTABLE_KEYSYMS:
                 return
             try:
-                user_start = self.text_widget.index(self._user_input_mark)
-                cursor     = self.text_widget.index(tk.INSERT)
-                if self.text_widget.compare(cursor, "<", user_start):
-                    self.text_widget.mark_set(tk.INSERT, user_start)
+                if self.text_widget.compare(tk.INSERT, "<", self._user_input_mark):
+                    self.text_widget.mark_set(tk.INSERT, self._user_input_mark)
             except Exception:
                 pass
 
         def _do_backspace(event):
             """Only block backspace when it would delete into the protected AI zone.
             Otherwise, let tkinter's native Text class binding handle it."""
-            import sys
-            user_start = self.text_widget.index(self._user_input_mark)
-            cursor = self.text_widget.index(tk.INSERT)
-            print(f"[DEBUG BS] cursor={cursor} user_start={user_start}", file=sys.stderr)
-            if self.text_widget.compare(cursor, "<=", user_start):
-                print(f"[DEBUG BS] BLOCKED", file=sys.stderr)
+            if self.text_widget.compare(tk.INSERT, "<=", self._user_input_mark):
                 return "break"  # Block: would delete into protected zone
             # Allow tkinter's native backspace — do NOT return "break"
-            print(f"[DEBUG BS] ALLOWED (returning None)", file=sys.stderr)
             return None
 
         def _do_delete(event):
             """Only block delete when cursor is in the protected AI zone."""
-            import sys
-            user_start = self.text_widget.index(self._user_input_mark)
-            cursor = self.text_widget.index(tk.INSERT)
-            print(f"[DEBUG DEL] cursor={cursor} user_start={user_start}", file=sys.stderr)
-            if self.text_widget.compare(cursor, "<", user_start):
+            if self.text_widget.compare(tk.INSERT, "<", self._user_input_mark):
                 return "break"
             return None
 
@@ -3179,15 +3745,15 @@ class MultilineInputDialog:
         hint_label = tk.Label(
             main_frame,
             text="AI output is shown above the line  ·  Type your response below it  ·  Ctrl+Enter to submit",
-            bg=self.theme_colors["bg_primary"],
+            bg=bg,
             fg=self.theme_colors["fg_secondary"],
-            font=(get_system_font()[0], get_system_font()[1] - 1),
+            font=HINT_FONT,
             anchor="center",
         )
         hint_label.grid(row=2, column=0, sticky="ew", pady=(0, 12))
 
         # Modern button frame (row 3)
-        button_frame = tk.Frame(main_frame, bg=self.theme_colors["bg_primary"])
+        button_frame = tk.Frame(main_frame, bg=bg)
         button_frame.grid(row=3, column=0, sticky="ew")
 
         # Create modern buttons
@@ -3204,6 +3770,11 @@ class MultilineInputDialog:
         # Handle window close
         self.dialog.protocol("WM_DELETE_WINDOW", self.cancel_clicked)
 
+        # Position, then map and style the finished window in one go
+        self.center_window()
+        self.dialog.deiconify()
+        configure_modern_window(self.dialog)
+
         # Focus on text widget
         self.text_widget.focus_set()
 
@@ -3218,41 +3789,205 @@ class MultilineInputDialog:
         # Wait for the dialog to complete
         self.dialog.wait_window()
     
-    def center_window(self):
-        """Center the dialog window on screen"""
-        self.dialog.update_idletasks()
-        width = self.dialog.winfo_width()
-        height = self.dialog.winfo_height()
-        
-        # Get screen dimensions
-        screen_width = self.dialog.winfo_screenwidth()
-        screen_height = self.dialog.winfo_screenheight()
-        
-        # Calculate center position
-        x = (screen_width // 2) - (width // 2)
-        y = (screen_height // 2) - (height // 2)
-        
-        # Platform-specific adjustments
-        if IS_MACOS:
-            y = max(50, y - 50)
-        elif IS_WINDOWS:
-            y = max(30, y - 30)
-        
-        self.dialog.geometry(f"{width}x{height}+{x}+{y}")
-    
+    def _populate(self, event=None):
+        """Insert the prompt, delineator and pre-fill on first map."""
+        # Guarded rather than unbound; see ChoiceDialog._populate
+        if self._populated:
+            return
+        self._populated = True
+
+        # Insert AI output (prompt) and the delineator on its own line in one
+        # call — Text.insert takes (text, tags) pairs, so no index() lookups
+        # or tag_add round-trips are needed.
+        sep_text = "\n" + MULTILINE_DELINEATOR + "\n"
+        if self._prompt:
+            self.text_widget.insert("1.0", self._prompt, "ai_output", sep_text, "separator")
+        else:
+            self.text_widget.insert("1.0", sep_text, "separator")
+
+        # Place the 'user_input_start' mark right after the delineator.
+        self.text_widget.mark_set(self._user_input_mark, tk.END)
+
+        # Insert any pre-fill for the user area (e.g., default_value)
+        if self._default_value:
+            self.text_widget.insert(tk.END, self._default_value, "user_input")
+
+        # Move cursor to end of user input area and scroll there
+        self.text_widget.mark_set(tk.INSERT, tk.END)
+        self.text_widget.see(tk.END)
+
     def ok_clicked(self):
         """Return only the text the user typed (after the delineator)."""
-        full = self.text_widget.get("1.0", tk.END)
-        if MULTILINE_DELINEATOR in full:
-            self.result = full[full.index(MULTILINE_DELINEATOR) + len(MULTILINE_DELINEATOR):].strip()
-        else:
-            self.result = full.strip()
+        # The mark sits right after the delineator, so only the user region is read
+        self.result = self.text_widget.get(self._user_input_mark, "end-1c").strip()
         self.dialog.destroy()
 
     def cancel_clicked(self):
         self.result = None
         self.dialog.destroy()
 
+def _telegram_timeout_seconds() -> int:
+    """Reply timeout for Telegram prompts (HITL_TELEGRAM_TIMEOUT_SECONDS, min 30)."""
+    try:
+        return max(30, int(os.getenv("HITL_TELEGRAM_TIMEOUT_SECONDS", "3600")))
+    except ValueError:
+        return 3600
+
+async def _await_telegram_reply(title: str, prompt: str, default_value: str = "") -> Optional[str]:
+    """Send a prompt over Telegram and await the raw reply (None on timeout).
+
+    The wait runs on a worker thread; if the tool call is cancelled the thread
+    is told to stop polling.
+    """
+    cancel_event = threading.Event()
+    try:
+        return await asyncio.to_thread(
+            _send_and_wait_telegram_multiline_input,
+            title,
+            prompt,
+            default_value,
+            _telegram_timeout_seconds(),
+            cancel_event,
+        )
+    except asyncio.CancelledError:
+        # The client gave up on this call — release the polling thread.
+        cancel_event.set()
+        raise
+
+# Info messages are coalesced while a send is in flight: the first one goes out
+# on the next loop tick, and everything queued meanwhile shares the following
+# sendMessage. HITL_TG_BATCH_MS adds an optional extra wait before each send.
+try:
+    _TELEGRAM_INFO_BATCH_SECONDS = max(0, int(os.getenv("HITL_TG_BATCH_MS", "0"))) / 1000
+except ValueError:
+    _TELEGRAM_INFO_BATCH_SECONDS = 0.0
+_info_batch: Optional[List[tuple]] = None
+_info_batch_future: Optional[asyncio.Future] = None
+# Strong reference to the running flush task (the loop only keeps a weak one)
+_info_flush_task: Optional[asyncio.Task] = None
+
+async def _flush_info_batch() -> None:
+    """Send queued info batches until none is left, then clear ``_info_flush_task``."""
+    global _info_batch, _info_batch_future, _info_flush_task
+    try:
+        while _info_batch is not None:
+            await asyncio.sleep(_TELEGRAM_INFO_BATCH_SECONDS)
+            notices, future = _info_batch, _info_batch_future
+            _info_batch = _info_batch_future = None
+            try:
+                future.set_result(await asyncio.to_thread(_telegram_send_info, notices))
+            except Exception as e:
+                future.set_exception(e)
+                future.exception()  # consumed here too, in case every caller was cancelled
+    finally:
+        _info_flush_task = None
+
+async def _telegram_send_info_batched(title: str, message: str) -> Dict[str, Any]:
+    """Queue an info message; calls queued before the next send share one sendMessage."""
+    global _info_batch, _info_batch_future, _info_flush_task
+    if _info_batch is None:
+        _info_batch = []
+        _info_batch_future = asyncio.get_running_loop().create_future()
+    _info_batch.append((title, message))
+    future = _info_batch_future
+    if _info_flush_task is None:
+        _info_flush_task = asyncio.create_task(_flush_info_batch())
+    # shield: one cancelled caller must not cancel the send for the others
+    return await asyncio.shield(future)
+
+# How often an open dialog checks whether its caller has given up on it
+_DIALOG_CANCEL_POLL_MS = 200
+
+def _close_gui_windows(root) -> None:
+    """Destroy every window open on the shared root (the root itself stays).
+
+    Every dialog is a Tk-drawn Toplevel (no native messagebox, which would run
+    its own modal loop), so destroying it ends the dialog's ``wait_window()``.
+    """
+    for child in list(root.children.values()):
+        try:
+            child.destroy()
+        except tk.TclError:
+            pass
+
+def _run_cancellable_dialog(dialog_func, args, cancel_event: threading.Event):
+    """Run ``dialog_func`` on the GUI thread, closing it once ``cancel_event`` is set.
+
+    The caller sets the event when it stops waiting (timeout or cancellation).
+    Without this an abandoned dialog would keep ``wait_window()`` running and
+    block every later dialog queued on the single GUI worker.
+    """
+    if cancel_event.is_set():
+        return None  # Abandoned while still queued behind another dialog
+    try:
+        root = _get_gui_root()
+    except Exception:
+        return dialog_func(*args)  # Let the helper report the GUI failure itself
+
+    def _watch():
+        if cancel_event.is_set():
+            _close_gui_windows(root)
+        else:
+            watch[0] = root.after(_DIALOG_CANCEL_POLL_MS, _watch)
+
+    watch = [root.after(_DIALOG_CANCEL_POLL_MS, _watch)]
+    try:
+        return dialog_func(*args)
+    finally:
+        try:
+            root.after_cancel(watch[0])
+        except tk.TclError:
+            pass
+
+async def _run_dialog(dialog_func, *args, timeout: float = 300):
+    """Run a dialog helper on the shared GUI worker and await its result.
+
+    Dialogs are serialized on the single ``_gui_executor`` thread (which owns
+    the Tk root); awaiting its future keeps the event loop free meanwhile.
+    If the wait times out or is cancelled, the dialog is closed on the GUI
+    thread so the worker is free for the next one.
+    """
+    cancel_event = threading.Event()
+    future = _gui_executor.submit(_run_cancellable_dialog, dialog_func, args, cancel_event)
+    try:
+        return await asyncio.wait_for(
+            asyncio.wrap_future(future),
+            timeout=timeout,  # 5 minute default
+        )
+    except (asyncio.TimeoutError, asyncio.CancelledError):
+        cancel_event.set()
+        raise
+
+# Opt-in exact-match answer cache (HITL_CACHE_CHOICES=true): asking the same
+# question with the same options again returns the earlier answer instead of
+# prompting the user. Keys include the title, so the same text under different
+# titles is asked again. Only successful answers are stored; bounded LRU.
+# Hit/miss counters are reported by health_check under "answer_cache".
+_ANSWER_CACHE_ENABLED = os.getenv("HITL_CACHE_CHOICES", "false").strip().lower() in {"1", "true", "yes", "on"}
+_ANSWER_CACHE_MAX_ENTRIES = 128
+_answer_cache: "OrderedDict[tuple, Dict[str, Any]]" = OrderedDict()
+_answer_cache_stats = {"hits": 0, "misses": 0}
+
+def _answer_cache_get(key: tuple) -> Optional[Dict[str, Any]]:
+    if not _ANSWER_CACHE_ENABLED:
+        return None
+    entry = _answer_cache.get(key)
+    if entry is None:
+        _answer_cache_stats["misses"] += 1
+        return None
+    _answer_cache_stats["hits"] += 1
+    _answer_cache.move_to_end(key)
+    return {**entry, "cached": True}
+
+def _answer_cache_put(key: tuple, result: Dict[str, Any]) -> Dict[str, Any]:
+    """Store a successful result (when enabled) and return it unchanged."""
+    if _ANSWER_CACHE_ENABLED:
+        _answer_cache[key] = result
+        _answer_cache.move_to_end(key)
+        if len(_answer_cache) > _ANSWER_CACHE_MAX_ENTRIES:
+            _answer_cache.popitem(last=False)
+    return result
+
 # MCP Tools
 
 @mcp.tool()
@@ -3272,9 +4007,59 @@ async def get_user_input(
     try:
         if ctx:
             await ctx.info(f"Requesting user input: {prompt}")
+
+        cache_key = ("input", title, prompt, default_value, input_type)
+        cached = _answer_cache_get(cache_key)
+        if cached is not None:
+            if ctx:
+                await ctx.info(f"Answered from cache: {cached['user_input']}")
+            return cached
+
+        if _TELEGRAM_ENABLED:
+            try:
+                type_hint = {"integer": "\n\n(Reply with a whole number.)", "float": "\n\n(Reply with a number.)"}.get(input_type, "")
+                reply = await _await_telegram_reply(title, prompt + type_hint, default_value)
+                if reply is None:
+                    if ctx:
+                        await ctx.warning("Telegram input timed out or was not received")
+                    return {
+                        "success": False,
+                        "user_input": None,
+                        "input_type": input_type,
+                        "cancelled": True,
+                        "platform": CURRENT_PLATFORM,
+                        "transport": "telegram",
+                        "error": "Timed out waiting for Telegram response"
+                    }
+                raw = _telegram_reply_text(reply).strip()
+                value = _coerce_typed_input(raw, input_type)
+                if value is None:
+                    return {
+                        "success": False,
+                        "user_input": None,
+                        "raw_reply": raw,
+                        "input_type": input_type,
+                        "cancelled": False,
+                        "platform": CURRENT_PLATFORM,
+                        "transport": "telegram",
+                        "error": f"Reply is not a valid {input_type} value"
+                    }
+                if ctx:
+                    await ctx.info(f"User provided input via Telegram: {value}")
+                return _answer_cache_put(cache_key, {
+                    "success": True,
+                    "user_input": value,
+                    "input_type": input_type,
+                    "cancelled": False,
+                    "platform": CURRENT_PLATFORM,
+                    "transport": "telegram"
+                })
+            except Exception as telegram_error:
+                if ctx:
+                    await ctx.warning(f"Telegram transport unavailable ({telegram_error}). Falling back to popup dialog.")
         
         # Ensure GUI is initialized
-        if not ensure_gui_initialized():
+        if not await ensure_gui_initialized_async():
             return {
                 "success": False,
                 "error": "GUI system not available",
@@ -3282,22 +4067,19 @@ async def get_user_input(
                 "platform": CURRENT_PLATFORM
             }
         
-        # Create the dialog in a separate thread to avoid blocking
-        import concurrent.futures
-        with concurrent.futures.ThreadPoolExecutor() as executor:
-            future = executor.submit(create_input_dialog, title, prompt, default_value, input_type)
-            result = future.result(timeout=300)  # 5 minute timeout
+        # Run the dialog on the GUI worker without blocking the event loop
+        result = await _run_dialog(create_input_dialog, title, prompt, default_value, input_type)
         
         if result is not None:
             if ctx:
                 await ctx.info(f"User provided input: {result}")
-            return {
+            return _answer_cache_put(cache_key, {
                 "success": True,
                 "user_input": result,
                 "input_type": input_type,
                 "cancelled": False,
                 "platform": CURRENT_PLATFORM
-            }
+            })
         else:
             if ctx:
                 await ctx.warning("User cancelled the input dialog")
@@ -3337,9 +4119,64 @@ async def get_user_choice(
         if ctx:
             await ctx.info(f"Requesting user choice: {prompt}")
             await ctx.debug(f"Available choices: {choices}")
+
+        cache_key = ("choice", title, prompt, tuple(choices), allow_multiple)
+        cached = _answer_cache_get(cache_key)
+        if cached is not None:
+            if ctx:
+                await ctx.info(f"Answered from cache: {cached['selected_choice']}")
+            return cached
+
+        if _TELEGRAM_ENABLED:
+            try:
+                options = "\n".join(f"{i}. {c}" for i, c in enumerate(choices, 1))
+                how = ("Reply with the option numbers, separated by commas." if allow_multiple
+                       else "Reply with the option number.")
+                reply = await _await_telegram_reply(title, f"{prompt}\n\n{options}\n\n{how}")
+                if reply is None:
+                    if ctx:
+                        await ctx.warning("Telegram choice timed out or was not received")
+                    return {
+                        "success": False,
+                        "selected_choice": None,
+                        "selected_choices": [],
+                        "allow_multiple": allow_multiple,
+                        "cancelled": True,
+                        "platform": CURRENT_PLATFORM,
+                        "transport": "telegram",
+                        "error": "Timed out waiting for Telegram response"
+                    }
+                raw = _telegram_reply_text(reply)
+                result = _telegram_parse_choice(raw, choices, allow_multiple)
+                if result is None:
+                    return {
+                        "success": False,
+                        "selected_choice": None,
+                        "selected_choices": [],
+                        "raw_reply": raw,
+                        "allow_multiple": allow_multiple,
+                        "cancelled": False,
+                        "platform": CURRENT_PLATFORM,
+                        "transport": "telegram",
+                        "error": "Reply did not match any of the offered choices"
+                    }
+                if ctx:
+                    await ctx.info(f"User selected via Telegram: {result}")
+                return _answer_cache_put(cache_key, {
+                    "success": True,
+                    "selected_choice": result,
+                    "selected_choices": result if isinstance(result, list) else [result],
+                    "allow_multiple": allow_multiple,
+                    "cancelled": False,
+                    "platform": CURRENT_PLATFORM,
+                    "transport": "telegram"
+                })
+            except Exception as telegram_error:
+                if ctx:
+                    await ctx.warning(f"Telegram transport unavailable ({telegram_error}). Falling back to popup dialog.")
         
         # Ensure GUI is initialized
-        if not ensure_gui_initialized():
+        if not await ensure_gui_initialized_async():
             return {
                 "success": False,
                 "error": "GUI system not available",
@@ -3347,23 +4184,20 @@ async def get_user_choice(
                 "platform": CURRENT_PLATFORM
             }
         
-        # Create the dialog in a separate thread
-        import concurrent.futures
-        with concurrent.futures.ThreadPoolExecutor() as executor:
-            future = executor.submit(create_choice_dialog, title, prompt, choices, allow_multiple)
-            result = future.result(timeout=300)  # 5 minute timeout
+        # Run the dialog on the GUI worker without blocking the event loop
+        result = await _run_dialog(create_choice_dialog, title, prompt, choices, allow_multiple)
         
         if result is not None:
             if ctx:
                 await ctx.info(f"User selected: {result}")
-            return {
+            return _answer_cache_put(cache_key, {
                 "success": True,
                 "selected_choice": result,
                 "selected_choices": result if isinstance(result, list) else [result],
                 "allow_multiple": allow_multiple,
                 "cancelled": False,
                 "platform": CURRENT_PLATFORM
-            }
+            })
         else:
             if ctx:
                 await ctx.warning("User cancelled the choice dialog")
@@ -3403,24 +4237,12 @@ async def get_multiline_input(
         if ctx:
             await ctx.info(f"Requesting multiline user input: {prompt}")
 
-        if is_telegram_enabled():
+        if _TELEGRAM_ENABLED:
             try:
                 if ctx:
                     await ctx.info("Telegram HITL mode enabled. Sending prompt and awaiting Telegram reply.")
 
-                timeout_seconds_raw = os.getenv("HITL_TELEGRAM_TIMEOUT_SECONDS", "3600")
-                try:
-                    timeout_seconds = max(30, int(timeout_seconds_raw))
-                except ValueError:
-                    timeout_seconds = 3600
-
-                result = await asyncio.to_thread(
-                    _send_and_wait_telegram_multiline_input,
-                    title,
-                    prompt,
-                    default_value,
-                    timeout_seconds
-                )
+                result = await _await_telegram_reply(title, prompt, default_value)
 
                 if result is not None:
                     if ctx:
@@ -3431,7 +4253,7 @@ async def get_multiline_input(
                     image_payload = None
                     user_text = result
                     try:
-                        parsed = json.loads(result)
+                        parsed = _json_loads_bytes(result) if result.startswith("{") else None
                         if isinstance(parsed, dict):
                             # ── Whispr voice message ──
                             if parsed.get("__whispr__"):
@@ -3544,7 +4366,7 @@ async def get_multiline_input(
                     await ctx.warning(f"Telegram transport unavailable ({telegram_error}). Falling back to popup dialog.")
         
         # Ensure GUI is initialized
-        if not ensure_gui_initialized():
+        if not await ensure_gui_initialized_async():
             return {
                 "success": False,
                 "error": "GUI system not available",
@@ -3552,11 +4374,8 @@ async def get_multiline_input(
                 "platform": CURRENT_PLATFORM
             }
         
-        # Create the dialog in a separate thread
-        import concurrent.futures
-        with concurrent.futures.ThreadPoolExecutor() as executor:
-            future = executor.submit(create_multiline_input_dialog, title, prompt, default_value)
-            result = future.result(timeout=300)  # 5 minute timeout
+        # Run the dialog on the GUI worker without blocking the event loop
+        result = await _run_dialog(create_multiline_input_dialog, title, prompt, default_value)
         
         if result is not None:
             if ctx:
@@ -3606,9 +4425,39 @@ async def show_confirmation_dialog(
     try:
         if ctx:
             await ctx.info(f"Requesting user confirmation: {message}")
+
+        if _TELEGRAM_ENABLED:
+            try:
+                reply = await _await_telegram_reply(title, f"{message}\n\nReply yes or no.")
+                if reply is None:
+                    if ctx:
+                        await ctx.warning("Telegram confirmation timed out or was not received")
+                    return {
+                        "success": False,
+                        "confirmed": False,
+                        "platform": CURRENT_PLATFORM,
+                        "transport": "telegram",
+                        "error": "Timed out waiting for Telegram response"
+                    }
+                raw = _telegram_reply_text(reply).strip()
+                # Anything other than an explicit yes counts as "no", like closing the dialog
+                confirmed = raw.lower().rstrip(".!") in _TELEGRAM_CONFIRM_WORDS
+                if ctx:
+                    await ctx.info(f"User confirmation result via Telegram: {'Yes' if confirmed else 'No'}")
+                return {
+                    "success": True,
+                    "confirmed": confirmed,
+                    "response": "yes" if confirmed else "no",
+                    "raw_reply": raw,
+                    "platform": CURRENT_PLATFORM,
+                    "transport": "telegram"
+                }
+            except Exception as telegram_error:
+                if ctx:
+                    await ctx.warning(f"Telegram transport unavailable ({telegram_error}). Falling back to popup dialog.")
         
         # Ensure GUI is initialized
-        if not ensure_gui_initialized():
+        if not await ensure_gui_initialized_async():
             return {
                 "success": False,
                 "error": "GUI system not available",
@@ -3616,11 +4465,8 @@ async def show_confirmation_dialog(
                 "platform": CURRENT_PLATFORM
             }
         
-        # Create the dialog in a separate thread
-        import concurrent.futures
-        with concurrent.futures.ThreadPoolExecutor() as executor:
-            future = executor.submit(show_confirmation, title, message)
-            result = future.result(timeout=300)  # 5 minute timeout
+        # Run the dialog on the GUI worker without blocking the event loop
+        result = await _run_dialog(show_confirmation, title, message)
         
         if ctx:
             await ctx.info(f"User confirmation result: {'Yes' if result else 'No'}")
@@ -3886,6 +4732,9 @@ async def list_images(
         return {"success": False, "error": str(e)}
 
 
+# Fixed fields of a successful show_info_message result
+_INFO_OK = {"success": True, "platform": CURRENT_PLATFORM}
+
 @mcp.tool()
 async def show_info_message(
     title: Annotated[str, Field(description="Title of the information dialog")],
@@ -3901,29 +4750,33 @@ async def show_info_message(
     try:
         if ctx:
             await ctx.info(f"Showing info message to user: {message}")
+
+        if _TELEGRAM_ENABLED:
+            try:
+                # Notifications are one-way; bursts are coalesced into one message
+                await _telegram_send_info_batched(title, message)
+                if ctx:
+                    await ctx.info("Info message sent via Telegram")
+                return {**_INFO_OK, "acknowledged": True, "transport": "telegram"}
+            except Exception as telegram_error:
+                if ctx:
+                    await ctx.warning(f"Telegram transport unavailable ({telegram_error}). Falling back to popup dialog.")
         
         # Ensure GUI is initialized
-        if not ensure_gui_initialized():
+        if not await ensure_gui_initialized_async():
             return {
                 "success": False,
                 "error": "GUI system not available",
                 "platform": CURRENT_PLATFORM
             }
         
-        # Create the dialog in a separate thread
-        import concurrent.futures
-        with concurrent.futures.ThreadPoolExecutor() as executor:
-            future = executor.submit(show_info, title, message)
-            result = future.result(timeout=300)  # 5 minute timeout
+        # Run the dialog on the GUI worker without blocking the event loop
+        result = await _run_dialog(show_info, title, message)
         
         if ctx:
             await ctx.info("Info message acknowledged by user")
         
-        return {
-            "success": True,
-            "acknowledged": result,
-            "platform": CURRENT_PLATFORM
-        }
+        return {**_INFO_OK, "acknowledged": result}
     
     except Exception as e:
         if ctx:
@@ -3934,17 +4787,9 @@ async def show_info_message(
             "platform": CURRENT_PLATFORM
         }
 
-# Add a prompt to get prompting guidance for LLMs
-@mcp.prompt()
-async def get_human_loop_prompt() -> Dict[str, str]:
-    """
-    Get prompting guidance for LLMs on when and how to use human-in-the-loop tools.
-    
-    This tool returns comprehensive guidance that helps LLMs understand when to pause
-    and ask for human input, decisions, or feedback during task execution.
-    """
-    guidance = {
-        "main_prompt": """
+# Static prompt guidance, built once at import rather than on every request
+_HUMAN_LOOP_GUIDANCE: Dict[str, str] = {
+    "main_prompt": """
 You have access to Human-in-the-Loop tools that allow you to interact directly with users through GUI dialogs. Use these tools strategically to enhance task completion and user experience.
 
 **WHEN TO USE HUMAN-IN-THE-LOOP TOOLS:**
@@ -3972,8 +4817,8 @@ You have access to Human-in-the-Loop tools that allow you to interact directly w
 - Give status updates for long-running processes
 - Offer meaningful choices rather than overwhelming options
 - Be concise but informative in dialog prompts""",
-        
-        "usage_examples": """
+    
+    "usage_examples": """
 **EXAMPLE SCENARIOS:**
 
 1. **File Operations:**
@@ -3995,8 +4840,8 @@ You have access to Human-in-the-Loop tools that allow you to interact directly w
    - "Found 3 data formats. Which should I use?" (choice)
    - "Enter the date range (YYYY-MM-DD to YYYY-MM-DD):" (input)
    - "Processing complete. 1,250 records updated." (info message)""",
-        
-        "decision_framework": """
+    
+    "decision_framework": """
 **DECISION FRAMEWORK FOR HUMAN-IN-THE-LOOP:**
 
 ASK YOURSELF:
@@ -4017,8 +4862,8 @@ OPTIMIZE FOR USER EXPERIENCE:
 - Provide context for why you need the information
 - Offer sensible defaults and suggestions
 - Make dialogs self-explanatory and actionable""",
-        
-        "integration_tips": """
+    
+    "integration_tips": """
 **INTEGRATION TIPS:**
 
 1. **Workflow Integration:**
@@ -4045,7 +4890,7 @@ OPTIMIZE FOR USER EXPERIENCE:
    - Show progress and intermediate results
    - Confirm successful completion of user-guided actions""",
 
-        "whispr_voice_input": """
+    "whispr_voice_input": """
 **WHISPR — VOICE MESSAGE TRANSCRIPTION:**
 
 When Whispr is enabled and the user sends a voice or audio message in
@@ -4073,9 +4918,18 @@ transcription.  Treat `user_input` as the authoritative final text.
 **Telegram commands the user can type:**
 `/whispr on|off|status|model <size>|lang <code>`
 """
-    }
+}
+
+# Add a prompt to get prompting guidance for LLMs
+@mcp.prompt()
+async def get_human_loop_prompt() -> Dict[str, str]:
+    """
+    Get prompting guidance for LLMs on when and how to use human-in-the-loop tools.
     
-    return guidance
+    This tool returns comprehensive guidance that helps LLMs understand when to pause
+    and ask for human input, decisions, or feedback during task execution.
+    """
+    return dict(_HUMAN_LOOP_GUIDANCE)
 
 # ── Whispr: MCP tool to toggle voice transcription ──
 @mcp.tool()
@@ -4147,13 +5001,59 @@ async def toggle_whispr(
     }
 
 
+_TOOLS_AVAILABLE = (
+    "get_user_input",
+    "get_user_choice",
+    "get_multiline_input",
+    "show_confirmation_dialog",
+    "show_info_message",
+    "get_window_screenshot",
+    "get_image",
+    "list_images",
+    "get_human_loop_prompt",
+    "toggle_whispr",
+)
+
+@functools.lru_cache(maxsize=1)
+def _static_health_info() -> Dict[str, Any]:
+    """Health fields that cannot change while the process runs.
+
+    Computed on first use: platform.processor() shells out to ``uname`` on Linux.
+    """
+    return {
+        "server_name": "Human-in-the-Loop Server",
+        "platform": CURRENT_PLATFORM,
+        "platform_details": {
+            "system": platform.system(),
+            "release": platform.release(),
+            "version": platform.version(),
+            "machine": platform.machine(),
+            "processor": platform.processor()
+        },
+        "python_version": sys.version.split()[0],
+        "is_windows": IS_WINDOWS,
+        "is_macos": IS_MACOS,
+        "is_linux": IS_LINUX,
+        "tools_available": _TOOLS_AVAILABLE,
+    }
+
+# Built from the same stripped values that decide _TELEGRAM_ENABLED
+_TELEGRAM_CONFIG_INFO = {
+    "has_bot_token": bool(_TG_TOKEN),
+    "has_chat_id": bool(_TG_CHAT_ID),
+    "chat_id": _TG_CHAT_ID,
+}
+
 # Add a health check tool
 @mcp.tool()
 async def health_check() -> Dict[str, Any]:
     """Check if the Human-in-the-Loop server is running and GUI is available."""
     try:
-        gui_available = ensure_gui_initialized()
-        telegram_enabled = is_telegram_enabled()
+        telegram_enabled = _TELEGRAM_ENABLED
+        # Every tool routes over Telegram when it is configured, so the GUI is
+        # only probed (loading Tcl/Tk and creating the root) when it is in use.
+        gui_available = None if telegram_enabled else await ensure_gui_initialized_async()
+        transport_ok = telegram_enabled or gui_available
 
         # ── Whispr status ──
         whispr_info = {"available": False, "enabled": False}
@@ -4165,41 +5065,19 @@ async def health_check() -> Dict[str, Any]:
                 whispr_info["model"] = cfg.model
                 whispr_info["language"] = cfg.language or "auto-detect"
         
-        return {
-            "status": "healthy" if gui_available else "degraded",
+        # Cached static fields plus the small per-call overlay
+        return _static_health_info() | {
+            "status": "healthy" if transport_ok else "degraded",
+            "transport": "telegram" if telegram_enabled else "gui",
             "gui_available": gui_available,
             "telegram_enabled": telegram_enabled,
-            "telegram_config": {
-                "has_bot_token": bool(os.getenv("HITL_TELEGRAM_BOT_TOKEN")),
-                "has_chat_id": bool(os.getenv("HITL_TELEGRAM_CHAT_ID")),
-                "chat_id": os.getenv("HITL_TELEGRAM_CHAT_ID", "")
-            },
+            "telegram_config": dict(_TELEGRAM_CONFIG_INFO),
             "whispr": whispr_info,
-            "server_name": "Human-in-the-Loop Server",
-            "platform": CURRENT_PLATFORM,
-            "platform_details": {
-                "system": platform.system(),
-                "release": platform.release(),
-                "version": platform.version(),
-                "machine": platform.machine(),
-                "processor": platform.processor()
+            "answer_cache": {
+                "enabled": _ANSWER_CACHE_ENABLED,
+                "entries": len(_answer_cache),
+                **_answer_cache_stats,
             },
-            "python_version": sys.version.split()[0],
-            "is_windows": IS_WINDOWS,
-            "is_macos": IS_MACOS,
-            "is_linux": IS_LINUX,
-            "tools_available": [
-                "get_user_input",
-                "get_user_choice", 
-                "get_multiline_input",
-                "show_confirmation_dialog",
-                "show_info_message",
-                "get_window_screenshot",
-                "get_image",
-                "list_images",
-                "get_human_loop_prompt",
-                "toggle_whispr"
-            ],
             "image_tools": {
                 "enabled": is_image_tools_enabled(),
                 "pil_available": PILImage is not None,
@@ -4216,76 +5094,98 @@ async def health_check() -> Dict[str, Any]:
 
 # Main execution
 
+# Per-platform startup notes, keyed by CURRENT_PLATFORM
+_PLATFORM_BANNER = {
+    "darwin": (
+        "macOS detected - Using native system fonts and window management\n"
+        "Note: You may need to allow Python to control your computer in System Preferences > Security & Privacy > Accessibility"
+    ),
+    "windows": (
+        "Windows detected - Using modern Windows 11-style GUI with enhanced styling\n"
+        "Features: Modern colors, improved fonts, hover effects, and sleek design"
+    ),
+    "linux": "Linux detected - Using Linux-compatible GUI settings with modern styling",
+}
+
+_TOOLS_BANNER = """Available tools:
+get_user_input - Get text/number input from user
+get_user_choice - Let user choose from options
+get_multiline_input - Get multi-line text from user
+show_confirmation_dialog - Ask user for yes/no confirmation
+show_info_message - Display information to user
+get_human_loop_prompt - Get guidance on when to use human-in-the-loop tools
+health_check - Check server status
+toggle_whispr - Enable/disable voice transcription (Whispr)"""
+
 def main():
     global _session_coordinator
 
-    print("Starting Human-in-the-Loop MCP Server...")
-    print("This server provides tools for LLMs to interact with humans through GUI dialogs.")
-    print(f"Platform: {CURRENT_PLATFORM} ({platform.system()} {platform.release()})")
-    print("")
-    print("Available tools:")
-    print("get_user_input - Get text/number input from user")
-    print("get_user_choice - Let user choose from options")
-    print("get_multiline_input - Get multi-line text from user")
-    print("show_confirmation_dialog - Ask user for yes/no confirmation")
-    print("show_info_message - Display information to user")
-    print("get_human_loop_prompt - Get guidance on when to use human-in-the-loop tools")
-    print("health_check - Check server status")
-    print("toggle_whispr - Enable/disable voice transcription (Whispr)")
-    if is_telegram_enabled():
-        print("Telegram transport: ENABLED (get_multiline_input will send+await via Telegram)")
+    # Collected and written in one go rather than one print() per line
+    banner = [
+        "Starting Human-in-the-Loop MCP Server...",
+        "This server provides tools for LLMs to interact with humans through GUI dialogs.",
+        f"Platform: {CURRENT_PLATFORM} ({platform.system()} {platform.release()})",
+        "",
+        _TOOLS_BANNER,
+    ]
+    telegram_enabled = is_telegram_enabled()
+    if telegram_enabled:
+        banner.append("Telegram transport: ENABLED (prompts are sent and awaited via Telegram)")
 
         # ── Session coordination ──
         _session_coordinator = SessionCoordinator()
         num = _session_coordinator.register()
-        atexit.register(_session_coordinator.deregister)
         tag = _session_coordinator.format_tag()
-        print(f"Session registered: {tag} (PID {os.getpid()})")
+        banner.append(f"Session registered: {tag} (PID {os.getpid()})")
         sessions = _session_coordinator.get_active_sessions()
         if len(sessions) > 1:
-            print(f"Active sessions: {len(sessions)}")
-            for s in sessions:
-                print(f"  {s['icon']} #{s['number']} · {s['workspace']} (PID {s['pid']})")
+            banner.append(f"Active sessions: {len(sessions)}")
+            banner.extend(
+                f"  {s['icon']} #{s['number']} · {s['workspace']} (PID {s['pid']})" for s in sessions
+            )
     else:
-        print("Telegram transport: DISABLED (set HITL_TELEGRAM_BOT_TOKEN and HITL_TELEGRAM_CHAT_ID)")
+        banner.append("Telegram transport: DISABLED (set HITL_TELEGRAM_BOT_TOKEN and HITL_TELEGRAM_CHAT_ID)")
 
     # ── Whispr status ──
     if _WHISPR_IMPORTED and whispr_is_available():
         cfg = whispr_get_config()
         state = "ENABLED" if cfg.enabled else "DISABLED"
         lang  = cfg.language or "auto"
-        print(f"Whispr voice transcription: {state} (model: {cfg.model}, lang: {lang})")
-        print("  Toggle in Telegram: /whispr on | /whispr off")
+        banner.append(f"Whispr voice transcription: {state} (model: {cfg.model}, lang: {lang})")
+        banner.append("  Toggle in Telegram: /whispr on | /whispr off")
     else:
-        print("Whispr voice transcription: NOT AVAILABLE (install faster-whisper to enable)")
+        banner.append("Whispr voice transcription: NOT AVAILABLE (install faster-whisper to enable)")
 
     # ── Image tools status ──
     img_state = "ENABLED" if is_image_tools_enabled() else "DISABLED"
     pil_state = "available" if PILImage else "NOT available (install Pillow for resize)"
-    print(f"Image tools (get_image, list_images): {img_state} (PIL: {pil_state})")
+    banner.append(f"Image tools (get_image, list_images): {img_state} (PIL: {pil_state})")
+
+    banner.append("")
 
-    print("")
-    
     # Platform-specific startup messages
-    if IS_MACOS:
-        print("macOS detected - Using native system fonts and window management")
-        print("Note: You may need to allow Python to control your computer in System Preferences > Security & Privacy > Accessibility")
-    elif IS_WINDOWS:
-        print("Windows detected - Using modern Windows 11-style GUI with enhanced styling")
-        print("Features: Modern colors, improved fonts, hover effects, and sleek design")
-    elif IS_LINUX:
-        print("Linux detected - Using Linux-compatible GUI settings with modern styling")
-    
-    # Test GUI availability
-    if ensure_gui_initialized():
-        print(" GUI system initialized successfully")
+    platform_note = _PLATFORM_BANNER.get(CURRENT_PLATFORM)
+    if platform_note:
+        banner.append(platform_note)
+
+    # Test GUI availability (Telegram setups load Tk lazily on the first popup)
+    if telegram_enabled:
+        banner.append(" GUI system: initialized on first fallback dialog")
+    elif ensure_gui_initialized():
+        banner.append(" GUI system initialized successfully")
         if IS_MACOS:
-            print(" macOS GUI optimizations applied")
+            banner.append(" macOS GUI optimizations applied")
     else:
-        print(" Warning: GUI system may not be available")
-    
-    print("")
-    print("Starting MCP server...")
+        banner.append(" Warning: GUI system may not be available")
+
+    banner.append("")
+    banner.append("Starting MCP server...")
+    sys.stdout.write("\n".join(banner) + "\n")
+    sys.stdout.flush()
+
+    # anyio's asyncio backend creates its loop through the current policy
+    if uvloop is not None and not IS_WINDOWS:
+        asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
     
     # Run the server
     mcp.run()
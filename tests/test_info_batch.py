@@ -0,0 +1,68 @@
+import asyncio
+import threading
+import unittest
+from unittest import mock
+
+import hitl_mcp_server as hitl
+
+
+class TelegramInfoBatchTests(unittest.TestCase):
+    def _burst(self, fake_send, count=5):
+        async def run():
+            return await asyncio.gather(
+                *(hitl._telegram_send_info_batched(f"t{i}", f"m{i}") for i in range(count)),
+                return_exceptions=True,
+            )
+
+        with mock.patch.object(hitl, "_telegram_send_info", side_effect=fake_send) as send:
+            results = asyncio.run(run())
+        self.assertIsNone(hitl._info_flush_task)
+        self.assertIsNone(hitl._info_batch)
+        return send, results
+
+    def test_burst_shares_one_send(self):
+        sent = {"ok": True, "message_id": 1}
+        send, results = self._burst(lambda notices: sent)
+        send.assert_called_once_with([(f"t{i}", f"m{i}") for i in range(5)])
+        self.assertTrue(all(r is sent for r in results))
+
+    def test_burst_shares_one_failure(self):
+        error = RuntimeError("boom")
+
+        def fail(notices):
+            raise error
+
+        send, results = self._burst(fail)
+        send.assert_called_once()
+        self.assertTrue(all(r is error for r in results))
+
+    def test_messages_queued_during_send_go_out_next(self):
+        started = threading.Event()
+        release = threading.Event()
+        batches = []
+
+        def slow_send(notices):
+            batches.append(list(notices))
+            if len(batches) == 1:
+                started.set()
+                release.wait(5)
+            return {"ok": True}
+
+        async def run():
+            first = asyncio.ensure_future(hitl._telegram_send_info_batched("a", "1"))
+            await asyncio.to_thread(started.wait, 5)
+            later = [
+                asyncio.ensure_future(hitl._telegram_send_info_batched("b", "2")),
+                asyncio.ensure_future(hitl._telegram_send_info_batched("c", "3")),
+            ]
+            await asyncio.sleep(0)
+            release.set()
+            await asyncio.gather(first, *later)
+
+        with mock.patch.object(hitl, "_telegram_send_info", side_effect=slow_send):
+            asyncio.run(run())
+        self.assertEqual(batches, [[("a", "1")], [("b", "2"), ("c", "3")]])
+
+
+if __name__ == "__main__":
+    unittest.main()